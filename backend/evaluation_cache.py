@@ -0,0 +1,69 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EvaluationCache:
+    """Bounded LRU cache of network evaluations keyed by UPF layout"""
+
+    def __init__(self, max_size=32, quantum=1e-3):
+        self.max_size = max_size
+        self.quantum = quantum  # km, UPF positions closer than this share an entry
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, network, *extra):
+        """Key from the topology version and the quantized UPF positions"""
+        quantized = np.round(np.asarray(network.upf_positions) / self.quantum)
+        return (
+            network.version,
+            network.association_mode,
+            quantized.shape,
+            quantized.astype(np.int64).tobytes(),
+            *extra,
+        )
+
+    def get(self, key):
+        """Return the cached entry for key (marking it recently used) or None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        """Store an entry, evicting the least recently used one when full
+
+        Array values are stored as read-only copies, so neither the caller's
+        arrays nor later edits to them affect the cached results.
+        """
+        stored = {}
+        for name, value in entry.items():
+            if isinstance(value, np.ndarray):
+                value = value.copy()
+                value.setflags(write=False)
+            stored[name] = value
+        self.entries[key] = stored
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_stats(self):
+        """Return hit/miss counters and occupancy"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,151 @@
+import itertools
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# Job states, a job ends in one of the last three
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when its job was cancelled"""
+
+
+class Job:
+    """Progress and outcome of one background job, shared with its worker"""
+
+    def __init__(self, job_id, name):
+        self.job_id = job_id
+        self.name = name
+        self.status = PENDING
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.future = None
+        self._cancel_requested = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        """Whether cancellation was requested, for job functions that poll it"""
+        return self._cancel_requested.is_set()
+
+    def report(self, progress, message=None):
+        """Record progress in [0, 1] from inside the job
+
+        Also the cancellation point: raises JobCancelled once cancel was called.
+        """
+        if self.cancelled:
+            raise JobCancelled()
+        with self._lock:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+            if message is not None:
+                self.message = message
+
+    def snapshot(self):
+        """Consistent copy of the job state"""
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "name": self.name,
+                "status": self.status,
+                "progress": self.progress,
+                "message": self.message,
+                "result": self.result,
+                "error": self.error,
+            }
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            if status == DONE and self.cancelled:
+                # Cancelled after the last report(), the result is dropped
+                status, result = CANCELLED, None
+            self.status = status
+            self.result = result
+            self.error = error
+            if status == DONE:
+                self.progress = 1.0
+
+
+class JobManager:
+    """Runs optimizations and sweeps in background threads
+
+    Submitted functions receive their Job as first argument, to report
+    progress and notice cancellation. Callers poll jobs by id instead of
+    waiting, so e.g. Dash callbacks never block on a long computation.
+    """
+
+    FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+    def __init__(self, max_workers=1):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, name=None, **kwargs):
+        """Queue func(job, *args, **kwargs) and return the job id"""
+        job_id = next(self._ids)
+        job = Job(job_id, name or getattr(func, "__name__", "job"))
+        with self._lock:
+            self.jobs[job_id] = job
+        job.future = self.executor.submit(self._run, job, func, args, kwargs)
+        return job_id
+
+    def poll(self, job_id):
+        """State of a job as a dict (status, progress, message, result, error)"""
+        return self.jobs[job_id].snapshot()
+
+    def cancel(self, job_id):
+        """Cancel a job, returning False if it had already finished
+
+        Pending jobs never start, running ones stop at their next report();
+        a job whose function returns after the request still ends cancelled.
+        """
+        job = self.jobs[job_id]
+        with job._lock:
+            if job.status in self.FINAL_STATES:
+                return False
+            job._cancel_requested.set()
+        if job.future.cancel():
+            job._finish(CANCELLED)
+        return True
+
+    def remove(self, job_id):
+        """Forget a finished job and return its final state"""
+        with self._lock:
+            job = self.jobs.pop(job_id)
+        return job.snapshot()
+
+    def active_jobs(self):
+        """Ids of the jobs that are pending or running"""
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return [job.job_id for job in jobs if job.status in (PENDING, RUNNING)]
+
+    def shutdown(self, wait=True):
+        """Cancel all unfinished jobs and stop the workers"""
+        for job_id in self.active_jobs():
+            self.cancel(job_id)
+        self.executor.shutdown(wait=wait)
+
+    @staticmethod
+    def _run(job, func, args, kwargs):
+        if job.cancelled:
+            job._finish(CANCELLED)
+            return
+        with job._lock:
+            job.status = RUNNING
+        try:
+            result = func(job, *args, **kwargs)
+        except JobCancelled:
+            job._finish(CANCELLED)
+        except Exception:
+            job._finish(FAILED, error=traceback.format_exc())
+        else:
+            job._finish(DONE, result)
@@ -0,0 +1,291 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from backend.profiler import default_profiler
+
+# Entries of a cached evaluation that describe associations rather than metrics
+_ASSOCIATIONS = ("ue_to_gnb", "gnb_to_upf", "ue_gnb_dist", "gnb_upf_dist")
+
+
+class MetricsEngine:
+    """Evaluates latencies and reliabilities together from shared intermediates"""
+
+    def __init__(
+        self, latency_calculator, reliability_analyzer, cache=None, profiler=None
+    ):
+        self.latency_calculator = latency_calculator
+        self.reliability_analyzer = reliability_analyzer
+        # Optional EvaluationCache used by evaluate_network
+        self.cache = cache
+        # Times the association and metric stages of evaluate_network
+        self.profiler = default_profiler if profiler is None else profiler
+
+    def evaluate_network(self, network, log_space=False):
+        """Re-associate network by proximity and evaluate it
+
+        With a cache, a UPF layout already seen for the same topology version
+        restores its associations and metrics instead of recomputing them.
+        Arrays restored from the cache are read-only.
+        """
+        if self.cache is None:
+            with self.profiler.stage("engine.associations"):
+                ue_gnb_dist, gnb_upf_dist = network.update_associations()
+            with self.profiler.stage("engine.metrics"):
+                return self.evaluate(
+                    network, ue_gnb_dist, gnb_upf_dist, log_space=log_space
+                )
+
+        key = self.cache.make_key(network, log_space)
+        entry = self.cache.get(key)
+        if entry is None:
+            with self.profiler.stage("engine.associations"):
+                ue_gnb_dist, gnb_upf_dist = network.update_associations()
+            with self.profiler.stage("engine.metrics"):
+                metrics = self.evaluate(
+                    network, ue_gnb_dist, gnb_upf_dist, log_space=log_space
+                )
+            entry = {
+                "ue_to_gnb": network.ue_to_gnb,
+                "gnb_to_upf": network.gnb_to_upf,
+                "ue_gnb_dist": ue_gnb_dist,
+                "gnb_upf_dist": gnb_upf_dist,
+                **metrics,
+            }
+            self.cache.put(key, entry)
+        else:
+            network.restore_associations(
+                entry["ue_to_gnb"],
+                entry["gnb_to_upf"],
+                entry["ue_gnb_dist"],
+                entry["gnb_upf_dist"],
+            )
+        return {name: entry[name] for name in entry if name not in _ASSOCIATIONS}
+
+    def update_affected(self, network, latencies, reliabilities):
+        """Refresh latencies and reliabilities of network.affected_ues only
+
+        Arrays that are read-only (e.g. cached) are copied before patching.
+        Returns the updated arrays in a metrics dict.
+        """
+        affected_ues = network.affected_ues
+        if affected_ues is None:
+            return self.evaluate(network, network.ue_gnb_dist, network.gnb_upf_dist)
+
+        if not latencies.flags.writeable:
+            latencies = latencies.copy()
+        if not reliabilities.flags.writeable:
+            reliabilities = reliabilities.copy()
+        if len(affected_ues) > 0:
+            metrics = self.evaluate(
+                network, network.ue_gnb_dist, network.gnb_upf_dist, ue_ids=affected_ues
+            )
+            latencies[affected_ues] = metrics["latencies"]
+            reliabilities[affected_ues] = metrics["reliabilities"]
+        return {"latencies": latencies, "reliabilities": reliabilities}
+
+    def evaluate(
+        self, network, ue_gnb_dist, gnb_upf_dist, ue_ids=None, log_space=False
+    ):
+        """Calculate latencies and reliabilities for all UEs (or ue_ids) in one pass
+
+        The association lookups, serving-distance gathers and per-gNB UE counts are
+        computed once and fed to both calculators. With log_space=True the
+        reliabilities are derived from log-reliabilities, which are returned
+        together with the matching unreliabilities (1 - reliability).
+        """
+        air_dist, fronthaul_dist = network.serving_distances(ue_gnb_dist, gnb_upf_dist)
+        ue_to_gnb = network.ue_to_gnb
+        if ue_ids is not None:
+            air_dist = air_dist[ue_ids]
+            ue_to_gnb = ue_to_gnb[ue_ids]
+
+        # Shared intermediates
+        ues_per_gnb = np.bincount(network.ue_to_gnb, minlength=network.num_gnbs)
+        load_share = ues_per_gnb[ue_to_gnb] / network.num_ues
+        fronthaul_dist = fronthaul_dist[ue_to_gnb]
+
+        metrics = {
+            "latencies": self.latency_calculator.compute_latencies(
+                air_dist, fronthaul_dist, load_share
+            )
+        }
+        if log_space:
+            log_reliabilities = self.reliability_analyzer.compute_reliabilities(
+                air_dist, fronthaul_dist, load_share, log_space=True
+            )
+            metrics["reliabilities"] = np.exp(log_reliabilities)
+            metrics["log_reliabilities"] = log_reliabilities
+            metrics["unreliabilities"] = -np.expm1(log_reliabilities)
+        else:
+            metrics["reliabilities"] = self.reliability_analyzer.compute_reliabilities(
+                air_dist, fronthaul_dist, load_share
+            )
+        return metrics
+
+    def layout_context(self, network):
+        """UPF-independent per-UE inputs of evaluate_layout, computed once per topology"""
+        air_dist, _ = network.serving_distances(
+            network.ue_gnb_dist, network.gnb_upf_dist
+        )
+        ues_per_gnb = np.bincount(network.ue_to_gnb, minlength=network.num_gnbs)
+        return {
+            "gnb_positions": np.array(network.gnb_positions, dtype=float),
+            "ue_to_gnb": network.ue_to_gnb,
+            "air_dist": air_dist,
+            "load_share": ues_per_gnb[network.ue_to_gnb] / network.num_ues,
+        }
+
+    def evaluate_layout(self, network, upf_positions, gnb_to_upf=None, context=None):
+        """Metrics network would have with UPFs at upf_positions, without mutating it
+
+        gNBs go to their nearest UPF unless gnb_to_upf is given; UE-to-gNB
+        associations are taken as they are. Only reads network (and a shared
+        layout_context), so concurrent calls from several threads are safe.
+        """
+        if context is None:
+            context = self.layout_context(network)
+        gnb_positions = context["gnb_positions"]
+        upf_positions = np.asarray(upf_positions, dtype=float)
+        if gnb_to_upf is None:
+            gnb_serving_dist, gnb_to_upf = cKDTree(upf_positions).query(gnb_positions)
+        else:
+            gnb_to_upf = np.asarray(gnb_to_upf, dtype=int)
+            gnb_serving_dist = np.linalg.norm(
+                gnb_positions - upf_positions[gnb_to_upf], axis=1
+            )
+
+        fronthaul_dist = gnb_serving_dist[context["ue_to_gnb"]]
+        air_dist, load_share = context["air_dist"], context["load_share"]
+        return {
+            "latencies": self.latency_calculator.compute_latencies(
+                air_dist, fronthaul_dist, load_share
+            ),
+            "reliabilities": self.reliability_analyzer.compute_reliabilities(
+                air_dist, fronthaul_dist, load_share
+            ),
+            "gnb_to_upf": gnb_to_upf,
+        }
+
+    def placement_context(self, network):
+        """Per-gNB aggregates needed to score UPF placements without touching network
+
+        UE-to-gNB association and the air/processing part of each UE's metrics do
+        not depend on UPF positions, so they are reduced once per gNB here.
+        """
+        air_dist, _ = network.serving_distances(
+            network.ue_gnb_dist, network.gnb_upf_dist
+        )
+        ue_to_gnb = network.ue_to_gnb
+        ues_per_gnb = np.bincount(ue_to_gnb, minlength=network.num_gnbs)
+        load_share = ues_per_gnb[ue_to_gnb] / network.num_ues
+
+        # Metrics with a zero-length fronthaul, the UPF-dependent factor is applied later
+        zero_fronthaul = np.zeros_like(air_dist)
+        base_latency = self.latency_calculator.compute_latencies(
+            air_dist, zero_fronthaul, load_share
+        )
+        base_reliability = self.reliability_analyzer.compute_reliabilities(
+            air_dist, zero_fronthaul, load_share
+        )
+
+        max_base_latency = np.full(network.num_gnbs, -np.inf)
+        min_base_latency = np.full(network.num_gnbs, np.inf)
+        max_base_reliability = np.full(network.num_gnbs, -np.inf)
+        min_base_reliability = np.full(network.num_gnbs, np.inf)
+        np.maximum.at(max_base_latency, ue_to_gnb, base_latency)
+        np.minimum.at(min_base_latency, ue_to_gnb, base_latency)
+        np.maximum.at(max_base_reliability, ue_to_gnb, base_reliability)
+        np.minimum.at(min_base_reliability, ue_to_gnb, base_reliability)
+
+        return {
+            "gnb_positions": np.array(network.gnb_positions, dtype=float),
+            "num_ues": network.num_ues,
+            "ues_per_gnb": ues_per_gnb,
+            "sum_base_latency": np.bincount(
+                ue_to_gnb, base_latency, minlength=network.num_gnbs
+            ),
+            "max_base_latency": max_base_latency,
+            "min_base_latency": min_base_latency,
+            "sum_base_reliability": np.bincount(
+                ue_to_gnb, base_reliability, minlength=network.num_gnbs
+            ),
+            "max_base_reliability": max_base_reliability,
+            "min_base_reliability": min_base_reliability,
+        }
+
+    def evaluate_placements(self, network, candidates, max_chunk_elements=2**22):
+        """Score K candidate UPF layouts of shape (K, num_upfs, 2) without mutating network"""
+        return self.score_placements(
+            self.placement_context(network), candidates, max_chunk_elements
+        )
+
+    def score_placements(self, context, candidates, max_chunk_elements=2**22):
+        """Score candidate UPF layouts against a placement_context
+
+        Candidates are processed in chunks holding at most max_chunk_elements
+        gNB x UPF distances. Returns a dict of per-candidate summary arrays.
+        """
+        candidates = np.asarray(candidates, dtype=float)
+        if candidates.ndim == 2:
+            candidates = candidates[None]
+        num_candidates, num_upfs, _ = candidates.shape
+
+        gnb_positions = context["gnb_positions"]
+        num_ues = context["num_ues"]
+        ues_per_gnb = context["ues_per_gnb"]
+        served = ues_per_gnb > 0
+        fronthaul_speed = self.latency_calculator.speed_fiber
+        reliability_factor = self.reliability_analyzer.distance_reliability_factor
+
+        summary = {
+            key: np.empty(num_candidates)
+            for key in (
+                "latency_average",
+                "latency_minimum",
+                "latency_maximum",
+                "reliability_average",
+                "reliability_minimum",
+                "reliability_maximum",
+            )
+        }
+        chunk_size = max(1, max_chunk_elements // max(1, len(gnb_positions) * num_upfs))
+
+        for start in range(0, num_candidates, chunk_size):
+            chunk = candidates[start : start + chunk_size]
+            # Serving fronthaul distance of every gNB, shape (chunk, num_gnbs)
+            fronthaul_dist = np.hypot(
+                gnb_positions[None, :, None, 0] - chunk[:, None, :, 0],
+                gnb_positions[None, :, None, 1] - chunk[:, None, :, 1],
+            ).min(axis=2)
+            # Latency is linear and reliability multiplicative in this distance
+            fronthaul_delay = (fronthaul_dist / fronthaul_speed) * 1000
+            fronthaul_reliability = np.exp(-reliability_factor * fronthaul_dist * 0.5)
+
+            window = slice(start, start + len(chunk))
+            summary["latency_average"][window] = (
+                context["sum_base_latency"].sum() + fronthaul_delay @ ues_per_gnb
+            ) / num_ues
+            summary["latency_minimum"][window] = np.min(
+                (context["min_base_latency"] + fronthaul_delay)[:, served], axis=1
+            )
+            summary["latency_maximum"][window] = np.max(
+                (context["max_base_latency"] + fronthaul_delay)[:, served], axis=1
+            )
+            summary["reliability_average"][window] = (
+                fronthaul_reliability @ context["sum_base_reliability"] / num_ues
+            )
+            summary["reliability_minimum"][window] = np.min(
+                (context["min_base_reliability"] * fronthaul_reliability)[:, served],
+                axis=1,
+            )
+            summary["reliability_maximum"][window] = np.max(
+                (context["max_base_reliability"] * fronthaul_reliability)[:, served],
+                axis=1,
+            )
+
+        summary["urllc_latency_achieved"] = summary["latency_average"] < 1.0
+        summary["urllc_reliability_achieved"] = (
+            summary["reliability_minimum"]
+            >= self.reliability_analyzer.reliability_threshold
+        )
+        return summary
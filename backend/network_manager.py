@@ -1,70 +1,350 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from backend.network_topology import NetworkTopology
 from backend.latency_calculator import LatencyCalculator
 from backend.reliability_analyzer import ReliabilityAnalyzer
+from backend.metrics_engine import MetricsEngine
+from backend.evaluation_cache import EvaluationCache
 from backend.upf_optimizer import UPFOptimizer
 from backend.packet_generator import PacketGenerator
+from backend.packet_simulator import PacketSimulator
+from backend.traffic_sources import traffic_chunks
+from backend.job_manager import JobManager, DONE
+from backend.pareto_sweep import ParetoSweep
+from backend.profiler import default_profiler
 
 
 class NetworkManager:
     """Main backend class that orchestrates all network components"""
 
-    def __init__(self, num_ues=15, num_gnbs=5, num_upfs=3):
+    def __init__(
+        self,
+        num_ues=15,
+        num_gnbs=5,
+        num_upfs=3,
+        association_mode="dense",
+        seed=42,
+        profiler=None,
+    ):
+        # Stage timings (see StageProfiler.report), shared with the engine
+        self.profiler = default_profiler if profiler is None else profiler
+
+        # Independent random streams for the layout and the packets, both
+        # derived from one root seed (an int, or None for fresh entropy)
+        topology_seed, self.packet_seed = np.random.SeedSequence(seed).spawn(2)
+
         # Initialize all components
-        self.topology = NetworkTopology(num_ues, num_gnbs, num_upfs)
+        self.topology = NetworkTopology(
+            num_ues,
+            num_gnbs,
+            num_upfs,
+            association_mode=association_mode,
+            seed=topology_seed,
+        )
         self.latency_calculator = LatencyCalculator()
         self.reliability_analyzer = ReliabilityAnalyzer()
-        self.upf_optimizer = UPFOptimizer()
-        self.packet_generator = PacketGenerator()
+        self.metrics_engine = MetricsEngine(
+            self.latency_calculator,
+            self.reliability_analyzer,
+            EvaluationCache(),
+            profiler=self.profiler,
+        )
+        self.upf_optimizer = UPFOptimizer(self.metrics_engine)
+        self.packet_generator = PacketGenerator(self.packet_seed)
+        self.packet_simulator = PacketSimulator(self.latency_calculator)
+        # Optimizations and sweeps run one at a time on topology copies
+        self.jobs = JobManager(max_workers=1)
+        self._optimization_jobs = set()  # ids apply_optimization accepts
 
         # Current state
         self.latencies = None
         self.reliabilities = None
+        self.stats = None
         self.packet_data = None
 
+        # Every derived stage has a version and remembers the versions of the
+        # inputs it was computed from; it is recomputed only when those change
+        self.metrics_version = 0  # from the topology's association_version
+        self.stats_version = 0  # from metrics_version
+        self.packets_version = 0  # from positions and association versions
+        self._metrics_input = None
+        self._stats_input = None
+        self._packets_input = None
+
         # Initialize metrics
         self.update_all_metrics()
 
-    def update_all_metrics(self):
-        """Update all network metrics"""
-        ue_gnb_dist, gnb_upf_dist = self.topology.update_associations()
-        self.latencies = self.latency_calculator.calculate_latencies(
-            self.topology, ue_gnb_dist, gnb_upf_dist
-        )
-        self.reliabilities = self.reliability_analyzer.calculate_reliability(
-            self.topology, ue_gnb_dist, gnb_upf_dist
+    def stage_versions(self):
+        """Current version of every stage of the network state"""
+        return {
+            "positions": self.topology.positions_version,
+            "associations": self.topology.association_version,
+            "metrics": self.metrics_version,
+            "stats": self.stats_version,
+            "packets": self.packets_version,
+        }
+
+    def update_all_metrics(self, force=False):
+        """Bring associations, metrics, stats and packets up to date
+
+        Only stages whose inputs changed are recomputed. With force=True UEs
+        and gNBs are re-associated by proximity and every stage is recomputed.
+        """
+        if force:
+            with self.profiler.stage("manager.associations"):
+                self.topology.update_associations()
+            self._metrics_input = None
+            self._stats_input = None
+            self._packets_input = None
+        self._refresh_packets()
+        return self.get_metric_stats()
+
+    def update_affected_metrics(self):
+        """Update metrics only for the UEs touched by the last incremental re-association
+
+        The metrics must have been current before that re-association.
+        """
+        affected_ues = self.topology.affected_ues
+        if affected_ues is None:
+            return self.update_all_metrics()
+
+        with self.profiler.stage("manager.metrics"):
+            metrics = self.metrics_engine.update_affected(
+                self.topology, self.latencies, self.reliabilities
+            )
+        self._set_metrics(metrics)
+        return self.get_metric_stats()
+
+    def get_metric_stats(self):
+        """Return latency and reliability statistics for the current metrics"""
+        self._refresh_stats()
+        return self.stats
+
+    def _refresh_metrics(self):
+        """Recompute associations and metrics if the positions or associations changed"""
+        if not self.topology.associations_current:
+            # Memoized per UPF layout by the engine's evaluation cache
+            with self.profiler.stage("manager.metrics"):
+                metrics = self.metrics_engine.evaluate_network(self.topology)
+        elif self._metrics_input != self.topology.association_version:
+            # Associations set by their owner (e.g. an optimizer strategy) are kept
+            with self.profiler.stage("manager.metrics"):
+                metrics = self.metrics_engine.evaluate(
+                    self.topology,
+                    self.topology.ue_gnb_dist,
+                    self.topology.gnb_upf_dist,
+                )
+        else:
+            return
+        self._set_metrics(metrics)
+
+    def _set_metrics(self, metrics):
+        self.latencies = metrics["latencies"]
+        self.reliabilities = metrics["reliabilities"]
+        self._metrics_input = self.topology.association_version
+        self.metrics_version += 1
+
+    def _refresh_stats(self):
+        self._refresh_metrics()
+        if self._stats_input == self.metrics_version:
+            return
+        with self.profiler.stage("manager.stats"):
+            self.stats = {
+                "latency_stats": self.latency_calculator.get_latency_stats(
+                    self.latencies
+                ),
+                "reliability_stats": self.reliability_analyzer.get_reliability_stats(
+                    self.reliabilities
+                ),
+            }
+        self._stats_input = self.metrics_version
+        self.stats_version += 1
+
+    def _refresh_packets(self, dt=0.0):
+        """Move the packets onto the current paths, and dt seconds along them"""
+        self._refresh_metrics()  # associations come with the metrics
+        packets_input = (
+            self.topology.positions_version,
+            self.topology.association_version,
         )
-        self.packet_data = self.packet_generator.generate_packets(self.topology)
+        if dt == 0.0 and self._packets_input == packets_input:
+            return
+        with self.profiler.stage("manager.packets"):
+            self.packet_data = self.packet_generator.advance(self.topology, dt)
+        self._packets_input = packets_input
+        self.packets_version += 1
+
+    def evaluate(self, upf_positions=None, gnb_to_upf=None):
+        """Metrics and stats for a what-if UPF layout, leaving the topology untouched
+
+        upf_positions defaults to the current layout; gNBs are associated with
+        their nearest UPF unless gnb_to_upf is given. Safe to call from several
+        threads at once as long as nobody mutates the topology meanwhile.
+        """
+        if upf_positions is None:
+            upf_positions = self.topology.upf_positions
+        with self.profiler.stage("manager.evaluate"):
+            metrics = self.metrics_engine.evaluate_layout(
+                self.topology, upf_positions, gnb_to_upf
+            )
+            return self._with_stats(metrics)
+
+    def evaluate_many(self, layouts, max_workers=None):
+        """Evaluate many what-if UPF layouts in parallel threads, in order
 
+        The UPF-independent part is computed once and shared read-only by all
+        workers; NumPy and the KD-tree queries release the GIL.
+        """
+        context = self.metrics_engine.layout_context(self.topology)
+
+        def evaluate_layout(upf_positions):
+            metrics = self.metrics_engine.evaluate_layout(
+                self.topology, upf_positions, context=context
+            )
+            return self._with_stats(metrics)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(evaluate_layout, layouts))
+
+    def _with_stats(self, metrics):
         return {
-            "latency_stats": self.latency_calculator.get_latency_stats(self.latencies),
+            **metrics,
+            "latency_stats": self.latency_calculator.get_latency_stats(
+                metrics["latencies"]
+            ),
             "reliability_stats": self.reliability_analyzer.get_reliability_stats(
-                self.reliabilities
+                metrics["reliabilities"]
             ),
         }
 
-    def optimize_upf_placement(self):
-        """Optimize UPF placement and update metrics"""
-        self.upf_optimizer.optimize_placement(self.topology)
-        return self.update_all_metrics()
+    def optimize_upf_placement(self, strategy="kmeans", **options):
+        """Optimize UPF placement with the given strategy and update metrics"""
+        # Strategies leave the topology associated (not always to the nearest UPF)
+        with self.profiler.stage("manager.optimize"):
+            self.upf_optimizer.optimize(self.topology, strategy, **options)
+        return self.get_metric_stats()
+
+    def submit_optimization(self, strategy="kmeans", **options):
+        """Start optimize_upf_placement as a background job on a topology copy
+
+        Returns the job id; poll it through self.jobs and adopt the result
+        with apply_optimization.
+        """
+        snapshot = copy.deepcopy(self.topology)
+        # The job gets its own optimizer, the shared one may run in the
+        # foreground meanwhile; the warm start is copied for "incremental"
+        optimizer = UPFOptimizer(self.metrics_engine)
+        optimizer.warm_state = copy.deepcopy(self.upf_optimizer.warm_state)
+
+        def optimize(job):
+            # Iterative strategies report progress and stop when cancelled
+            if strategy in UPFOptimizer.REPORTING:
+                optimizer.optimize(snapshot, strategy, progress=job.report, **options)
+            else:
+                optimizer.optimize(snapshot, strategy, **options)
+            return snapshot
+
+        job_id = self.jobs.submit(optimize, name=f"optimize ({strategy})")
+        self._optimization_jobs.add(job_id)
+        return job_id
+
+    def submit_sweep(self, min_upfs=1, max_upfs=16, **sweep_options):
+        """Start a ParetoSweep over the UPF count as a background job
+
+        The job reports one progress step per UPF count and its result is the
+        sweep DataFrame. sweep_options are passed to ParetoSweep.
+        """
+        snapshot = copy.deepcopy(self.topology)
+        sweep = ParetoSweep(**sweep_options)
+
+        def run_sweep(job):
+            return sweep.run(snapshot, min_upfs, max_upfs, progress=job.report)
+
+        return self.jobs.submit(run_sweep, name="pareto sweep")
+
+    def apply_optimization(self, job_id):
+        """Adopt the UPF layout of a finished optimization job
+
+        Returns the new metric stats, or None if the job is not done (still
+        running, failed or cancelled) or the UEs or gNBs moved since it was submitted (its layout no longer applies).
+        The job is forgotten once it has finished either way. Raises
+        ValueError for jobs not started by submit_optimization (e.g. sweeps),
+        which are left untouched.
+        """
+        if job_id not in self._optimization_jobs:
+            raise ValueError(f"Job {job_id} is not an optimization job")
+        state = self.jobs.poll(job_id)
+        if state["status"] not in self.jobs.FINAL_STATES:
+            return None
+        self.jobs.remove(job_id)
+        self._optimization_jobs.discard(job_id)
+        optimized = state["result"]
+        if state["status"] != DONE or optimized.version != self.topology.version:
+            return None
+
+        # Strategies in UPFOptimizer.RESIZING may have changed the UPF count
+        self.topology.num_upfs = optimized.num_upfs
+        self.topology.upf_positions = optimized.upf_positions
+        # Keep the strategy's associations (e.g. capacity constrained)
+        self.topology.restore_associations(
+            optimized.ue_to_gnb,
+            optimized.gnb_to_upf,
+            optimized.ue_gnb_dist,
+            optimized.gnb_upf_dist,
+            constrained=optimized.constrained_assignment,
+        )
+        return self.get_metric_stats()
 
     def randomize_upf_positions(self):
-        """Randomize UPF positions and update metrics"""
-        self.topology.randomize_upf_positions()
-        return self.update_all_metrics()
+        """Randomize UPF positions and update metrics
+
+        The associations are left to _refresh_metrics, which restores them
+        from the evaluation cache when the layout was evaluated before.
+        """
+        self.topology.randomize_upf_positions(associate=False)
+        return self.get_metric_stats()
 
     def move_upf(self, upf_id, new_position):
         """Move a specific UPF and update metrics"""
-        self.topology.move_upf(upf_id, new_position)
-        return self.update_all_metrics()
+        self._refresh_metrics()  # patched below, so it must be current
+        with self.profiler.stage("manager.associations"):
+            self.topology.move_upf(upf_id, new_position, incremental=True)
+        return self.update_affected_metrics()
 
     def generate_new_packets(self):
-        """Generate new packets and return data"""
-        self.packet_data = self.packet_generator.generate_packets(self.topology)
+        """Replace the packets in flight with a fresh flow and return data"""
+        self.packet_generator.reset_flow()
+        self._packets_input = None
+        self._refresh_packets()
         return self.packet_data
 
+    def reset_packet_stream(self):
+        """Restart packet generation from the beginning of its random stream"""
+        self.packet_generator.rng = np.random.default_rng(self.packet_seed)
+        self.generate_new_packets()
+
+    def advance_packets(self, dt):
+        """Move the packets in flight dt seconds along their paths and return data"""
+        self._refresh_packets(dt)
+        return self.packet_data
+
+    def simulate_traffic(self, sources, duration, chunk_size=65536):
+        """Run the traffic sources for duration ms through the packet simulator
+
+        Packets are generated and simulated chunk by chunk, so memory does not
+        grow with the duration. Returns the empirical latency/throughput stats.
+        """
+        self.packet_simulator.reset()
+        with self.profiler.stage("manager.simulate_traffic"):
+            for send_times, ue_ids in traffic_chunks(sources, chunk_size, duration):
+                self.packet_simulator.simulate(self.topology, send_times, ue_ids)
+        return self.packet_simulator.get_simulation_stats()
+
     def get_current_state(self):
-        """Return the current state of the network"""
+        """Return the current state of the network, refreshing only stale stages"""
+        self._refresh_packets()
         return {
             "topology": {
                 "ue_positions": self.topology.ue_positions,
@@ -76,4 +356,5 @@ class NetworkManager:
             "latencies": self.latencies,
             "reliabilities": self.reliabilities,
             "packet_data": self.packet_data,
+            "versions": self.stage_versions(),
         }
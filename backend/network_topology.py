@@ -1,30 +1,125 @@
+import itertools
+
 import numpy as np
+from scipy.spatial import cKDTree
+
+# Shared by all topologies so a version also identifies the instance
+_versions = itertools.count()
 
 
 class NetworkTopology:
     """Handles network element positions and their associations"""
 
-    def __init__(self, num_ues=15, num_gnbs=5, num_upfs=3, scale_factor=10):
+    def __init__(
+        self,
+        num_ues=15,
+        num_gnbs=5,
+        num_upfs=3,
+        scale_factor=10,
+        association_mode="dense",
+        seed=42,
+    ):
         self.num_ues = num_ues
         self.num_gnbs = num_gnbs
         self.num_upfs = num_upfs
         self.scale_factor = scale_factor  # 10km area
-        np.random.seed(42)
+        # "dense" returns full distance matrices, "kdtree" returns serving distances
+        self.association_mode = association_mode
+        # Bumped whenever UE or gNB positions change, UPF positions are not included
+        self.version = next(_versions)
+        # Bumped whenever UPF positions change
+        self.upf_version = next(_versions)
+        # Private random stream, seed may be an int, a SeedSequence or a Generator
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
 
         # Initial positions - scale in km (0-10km)
-        self.ue_positions = np.random.rand(num_ues, 2) * self.scale_factor
-        self.gnb_positions = np.random.rand(num_gnbs, 2) * self.scale_factor
-        self.upf_positions = np.random.rand(num_upfs, 2) * self.scale_factor
+        self.ue_positions = self.rng.random((num_ues, 2)) * self.scale_factor
+        self.gnb_positions = self.rng.random((num_gnbs, 2)) * self.scale_factor
+        self.upf_positions = self.rng.random((num_upfs, 2)) * self.scale_factor
 
         # Association maps
         self.ue_to_gnb = None
         self.gnb_to_upf = None
+        # Bumped whenever the associations change, together with the
+        # positions_version they were computed for
+        self.association_version = None
+        self.associated_positions = None
+        # True while gnb_to_upf was set explicitly (e.g. capacity constrained)
+        # rather than by proximity, so it must not be patched incrementally
+        self.constrained_assignment = False
+
+        # Distances from the last association update (matrices or serving vectors)
+        self.ue_gnb_dist = None
+        self.gnb_upf_dist = None
+
+        # UEs whose serving path changed in the last incremental update (None = all)
+        self.affected_ues = None
+        # UE ids grouped by serving gNB, rebuilt lazily after a full update
+        self._ues_by_gnb = None
+        self._gnb_offsets = None
 
         # Initialize associations
         self.update_associations()
 
+    @property
+    def ue_positions(self):
+        return self._ue_positions
+
+    @ue_positions.setter
+    def ue_positions(self, positions):
+        self._ue_positions = positions
+        self.mark_modified()
+
+    @property
+    def gnb_positions(self):
+        return self._gnb_positions
+
+    @gnb_positions.setter
+    def gnb_positions(self, positions):
+        self._gnb_positions = positions
+        self.mark_modified()
+
+    @property
+    def upf_positions(self):
+        return self._upf_positions
+
+    @upf_positions.setter
+    def upf_positions(self, positions):
+        self._upf_positions = positions
+        self.mark_upfs_modified()
+
+    @property
+    def positions_version(self):
+        """Identifies the current UE, gNB and UPF positions together"""
+        return (self.version, self.upf_version)
+
+    @property
+    def associations_current(self):
+        """Whether the associations were computed for the current positions"""
+        return self.associated_positions == self.positions_version
+
+    def mark_modified(self):
+        """Record a UE/gNB change, needed after editing the position arrays in place"""
+        self.version = next(_versions)
+
+    def mark_upfs_modified(self):
+        """Record a UPF change, needed after editing upf_positions in place"""
+        self.upf_version = next(_versions)
+
+    def _mark_associated(self):
+        self.association_version = next(_versions)
+        self.associated_positions = self.positions_version
+
     def update_associations(self):
         """Update the associations between UEs, gNBs, and UPFs based on proximity"""
+        self.affected_ues = None
+        self._ues_by_gnb = None
+        self.constrained_assignment = False
+        self._mark_associated()
+        if self.association_mode == "kdtree":
+            return self._update_associations_kdtree()
+
         # Calculate distances between UEs and gNBs
         ue_gnb_dist = np.linalg.norm(
             self.ue_positions[:, None] - self.gnb_positions, axis=2
@@ -33,26 +128,170 @@ class NetworkTopology:
         self.ue_to_gnb = np.argmin(ue_gnb_dist, axis=1)
 
         # Calculate distances between gNBs and UPFs
-        gnb_upf_dist = np.zeros((self.num_gnbs, self.num_upfs))
-        for gnb_id in range(self.num_gnbs):
-            for upf_id in range(self.num_upfs):
-                gnb_upf_dist[gnb_id, upf_id] = np.linalg.norm(
-                    self.gnb_positions[gnb_id] - self.upf_positions[upf_id]
-                )
+        gnb_upf_dist = np.linalg.norm(
+            self.gnb_positions[:, None] - self.upf_positions, axis=2
+        )
         # Assign each gNB to nearest UPF
         self.gnb_to_upf = np.argmin(gnb_upf_dist, axis=1)
 
+        self.ue_gnb_dist, self.gnb_upf_dist = ue_gnb_dist, gnb_upf_dist
+        return ue_gnb_dist, gnb_upf_dist
+
+    def _update_associations_kdtree(self):
+        """Nearest-neighbour association through KD-trees, O(N log M) memory-bounded"""
+        # Serving distance of each UE to its gNB, shape (num_ues,)
+        ue_serving_dist, self.ue_to_gnb = cKDTree(self.gnb_positions).query(
+            self.ue_positions
+        )
+        # Serving distance of each gNB to its UPF, shape (num_gnbs,)
+        gnb_serving_dist, self.gnb_to_upf = cKDTree(self.upf_positions).query(
+            self.gnb_positions
+        )
+
+        self.ue_gnb_dist, self.gnb_upf_dist = ue_serving_dist, gnb_serving_dist
+        return ue_serving_dist, gnb_serving_dist
+
+    def update_upf_associations(self):
+        """Re-associate gNBs with their nearest UPF, keeping the UE associations
+
+        Only the gNB-to-UPF stage is recomputed, so this is cheap while just
+        UPFs moved; after a UE or gNB change it falls back to a full update.
+        """
+        if self.ue_to_gnb is None or self.associated_positions is None:
+            return self.update_associations()
+        if self.associated_positions[0] != self.version:
+            return self.update_associations()
+
+        self.affected_ues = None
+        self.constrained_assignment = False
+        self._mark_associated()
+        if self.association_mode == "kdtree":
+            self.gnb_upf_dist, self.gnb_to_upf = cKDTree(self.upf_positions).query(
+                self.gnb_positions
+            )
+        else:
+            self.gnb_upf_dist = np.linalg.norm(
+                self.gnb_positions[:, None] - self.upf_positions, axis=2
+            )
+            self.gnb_to_upf = np.argmin(self.gnb_upf_dist, axis=1)
+        return self.ue_gnb_dist, self.gnb_upf_dist
+
+    def restore_associations(
+        self, ue_to_gnb, gnb_to_upf, ue_gnb_dist, gnb_upf_dist, constrained=False
+    ):
+        """Reinstate associations computed earlier for the current positions
+
+        Pass constrained=True when gnb_to_upf came from assign_gnbs.
+        """
+        self.ue_to_gnb, self.gnb_to_upf = ue_to_gnb, gnb_to_upf
+        self.ue_gnb_dist, self.gnb_upf_dist = ue_gnb_dist, gnb_upf_dist
+        self.constrained_assignment = constrained
+        self.affected_ues = None
+        self._ues_by_gnb = None
+        self._mark_associated()
         return ue_gnb_dist, gnb_upf_dist
 
-    def randomize_upf_positions(self):
-        """Randomize positions of UPFs"""
-        self.upf_positions = np.random.rand(self.num_upfs, 2) * self.scale_factor
-        return self.update_associations()
+    def assign_gnbs(self, gnb_to_upf):
+        """Set an explicit gNB-to-UPF assignment (e.g. capacity constrained)"""
+        self.gnb_to_upf = np.asarray(gnb_to_upf, dtype=int)
+        if self.gnb_upf_dist.ndim == 1:
+            self.gnb_upf_dist = np.linalg.norm(
+                self.gnb_positions - self.upf_positions[self.gnb_to_upf], axis=1
+            )
+        self.constrained_assignment = True
+        self.affected_ues = None
+        self._mark_associated()
+        return self.ue_gnb_dist, self.gnb_upf_dist
+
+    def serving_distances(self, ue_gnb_dist, gnb_upf_dist):
+        """Return (per-UE air distance, per-gNB fronthaul distance) for either distance form"""
+        ue_gnb_dist = np.asarray(ue_gnb_dist)
+        gnb_upf_dist = np.asarray(gnb_upf_dist)
+
+        # Dense matrices are reduced to the serving entries, sparse vectors pass through
+        if ue_gnb_dist.ndim == 2:
+            ue_gnb_dist = ue_gnb_dist[np.arange(len(self.ue_to_gnb)), self.ue_to_gnb]
+        if gnb_upf_dist.ndim == 2:
+            gnb_upf_dist = gnb_upf_dist[
+                np.arange(len(self.gnb_to_upf)), self.gnb_to_upf
+            ]
+        return ue_gnb_dist, gnb_upf_dist
+
+    def randomize_upf_positions(self, associate=True):
+        """Randomize positions of UPFs
+
+        With associate=False the associations are left stale for the caller
+        to update (associations_current is False), and None is returned.
+        """
+        self.upf_positions = self.rng.random((self.num_upfs, 2)) * self.scale_factor
+        if associate:
+            return self.update_associations()
 
-    def move_upf(self, upf_id, new_position):
-        """Move a UPF to a new position"""
+    def move_upf(self, upf_id, new_position, incremental=False):
+        """Move a UPF to a new position
+
+        With incremental=True only the gNBs whose nearest UPF can change are
+        re-associated and the affected UEs are left in self.affected_ues.
+        An explicit (constrained) assignment is not kept: it is replaced by a
+        full proximity update, as the nearest-UPF patching would break it.
+        """
         # Ensure within bounds
         x = max(0, min(self.scale_factor, new_position[0]))
         y = max(0, min(self.scale_factor, new_position[1]))
         self.upf_positions[upf_id] = [x, y]
-        return self.update_associations()
+        self.mark_upfs_modified()
+        if not incremental or self.gnb_to_upf is None or self.constrained_assignment:
+            return self.update_associations()
+
+        self.reassociate_upf(upf_id)
+        return self.ue_gnb_dist, self.gnb_upf_dist
+
+    def reassociate_upf(self, upf_id):
+        """Re-associate gNBs after a single UPF moved, returning (gNB ids, UE ids) affected"""
+        new_dist = np.linalg.norm(
+            self.gnb_positions - self.upf_positions[upf_id], axis=1
+        )
+        _, serving_dist = self.serving_distances(self.ue_gnb_dist, self.gnb_upf_dist)
+
+        # gNBs previously served by the moved UPF may now prefer another one,
+        # any other gNB only changes if the moved UPF became its nearest
+        # The gNB-level arrays are updated in place, they may be shared (cached)
+        self.gnb_to_upf = self.gnb_to_upf.copy()
+        self.gnb_upf_dist = self.gnb_upf_dist.copy()
+
+        lost = np.flatnonzero(self.gnb_to_upf == upf_id)
+        gained = np.flatnonzero((new_dist < serving_dist) & (self.gnb_to_upf != upf_id))
+
+        if self.gnb_upf_dist.ndim == 2:
+            self.gnb_upf_dist[:, upf_id] = new_dist
+            self.gnb_to_upf[lost] = np.argmin(self.gnb_upf_dist[lost], axis=1)
+        else:
+            lost_dist = np.linalg.norm(
+                self.gnb_positions[lost][:, None] - self.upf_positions, axis=2
+            )
+            self.gnb_to_upf[lost] = np.argmin(lost_dist, axis=1)
+            self.gnb_upf_dist[lost] = lost_dist[
+                np.arange(len(lost)), self.gnb_to_upf[lost]
+            ]
+            self.gnb_upf_dist[gained] = new_dist[gained]
+        self.gnb_to_upf[gained] = upf_id
+
+        affected_gnbs = np.union1d(lost, gained)
+        self.affected_ues = self.ues_of_gnbs(affected_gnbs)
+        self._mark_associated()
+        return affected_gnbs, self.affected_ues
+
+    def ues_of_gnbs(self, gnb_ids):
+        """Return the ids of the UEs attached to the given gNBs in O(result) time"""
+        if self._ues_by_gnb is None:
+            self._ues_by_gnb = np.argsort(self.ue_to_gnb, kind="stable")
+            self._gnb_offsets = np.concatenate(
+                ([0], np.cumsum(np.bincount(self.ue_to_gnb, minlength=self.num_gnbs)))
+            )
+
+        gnb_ids = np.asarray(gnb_ids, dtype=int)
+        starts = self._gnb_offsets[gnb_ids]
+        counts = self._gnb_offsets[gnb_ids + 1] - starts
+        # Concatenate the [start, start + count) slices without a Python loop
+        shifts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return self._ues_by_gnb[shifts + np.arange(counts.sum())]
@@ -1,68 +1,256 @@
 import numpy as np
 
+# Node type codes used in packet records
+NODE_TYPES = ("UE", "gNB", "UPF")
+UE, GNB, UPF = range(len(NODE_TYPES))
+
+# One record per packet in transit
+PACKET_DTYPE = np.dtype(
+    [
+        ("x", np.float32),
+        ("y", np.float32),
+        ("source_type", np.int8),
+        ("source_id", np.int32),
+        ("target_type", np.int8),
+        ("target_id", np.int32),
+        ("size", np.uint8),  # Size in pixels
+    ]
+)
+
+PACKET_SIZES = np.array([5, 8, 12], dtype=np.uint8)
+
 
 class PacketGenerator:
     """Generates packets for network simulation"""
 
-    def __init__(self):
-        self.packet_positions = []
-        self.packet_source = []
-        self.packet_target = []
-        self.packet_size = []
+    def __init__(self, rng=None):
+        # Private random stream, rng may be a Generator or anything seeding one
+        self.rng = np.random.default_rng(rng)
+        self.packets = np.empty(0, dtype=PACKET_DTYPE)
         self.active_ratio = 0.3  # % of UEs that are active
+        self.leg_time = 1.0  # seconds an animated packet spends on each link
+        self.ring = None  # packets in flight, see advance
 
     def generate_packets(self, network):
-        """Generate packets between UEs and their serving UPFs through gNBs"""
-        # Clear existing packets
-        self.packet_positions = []
-        self.packet_source = []
-        self.packet_target = []
-        self.packet_size = []
+        """Generate packets between UEs and their serving UPFs through gNBs
 
+        Returns a PACKET_DTYPE structured array holding, for every active UE, one
+        packet on its UE-gNB link followed by one on its gNB-UPF link.
+        """
         # Generate new packets - default 30% of UEs send packets
-        active_ues = np.random.choice(
-            range(network.num_ues),
+        active_ues = self.rng.choice(
+            network.num_ues,
             size=max(1, int(self.active_ratio * network.num_ues)),
             replace=False,
         )
+        gnb_ids = network.ue_to_gnb[active_ues]
+        upf_ids = network.gnb_to_upf[gnb_ids]
 
-        for ue_id in active_ues:
-            gnb_id = network.ue_to_gnb[ue_id]
-            upf_id = network.gnb_to_upf[gnb_id]
+        # Row 0 is the UE-gNB leg, row 1 the gNB-UPF leg of each active UE
+        packets = np.empty((2, len(active_ues)), dtype=PACKET_DTYPE)
+        packets["source_type"] = [[UE], [GNB]]
+        packets["source_id"] = [active_ues, gnb_ids]
+        packets["target_type"] = [[GNB], [UPF]]
+        packets["target_id"] = [gnb_ids, upf_ids]
 
-            # Position along the UE-gNB path
-            progress_to_gnb = np.random.uniform(0, 1)
-            x = network.ue_positions[ue_id, 0] + progress_to_gnb * (
-                network.gnb_positions[gnb_id, 0] - network.ue_positions[ue_id, 0]
-            )
-            y = network.ue_positions[ue_id, 1] + progress_to_gnb * (
-                network.gnb_positions[gnb_id, 1] - network.ue_positions[ue_id, 1]
-            )
-            self.packet_positions.append([x, y])
-            self.packet_source.append(("UE", ue_id))
-            self.packet_target.append(("gNB", gnb_id))
-            self.packet_size.append(np.random.choice([5, 8, 12]))  # Size in pixels
-
-            # Position along the gNB-UPF path
-            progress_to_upf = np.random.uniform(0, 1)
-            x = network.gnb_positions[gnb_id, 0] + progress_to_upf * (
-                network.upf_positions[upf_id, 0] - network.gnb_positions[gnb_id, 0]
-            )
-            y = network.gnb_positions[gnb_id, 1] + progress_to_upf * (
-                network.upf_positions[upf_id, 1] - network.gnb_positions[gnb_id, 1]
-            )
-            self.packet_positions.append([x, y])
-            self.packet_source.append(("gNB", gnb_id))
-            self.packet_target.append(("UPF", upf_id))
-            self.packet_size.append(np.random.choice([5, 8, 12]))  # Size in pixels
-
-        return {
-            "positions": self.packet_positions,
-            "source": self.packet_source,
-            "target": self.packet_target,
-            "size": self.packet_size,
-        }
+        # Position along each path
+        starts = np.stack(
+            [network.ue_positions[active_ues], network.gnb_positions[gnb_ids]]
+        )
+        ends = np.stack(
+            [network.gnb_positions[gnb_ids], network.upf_positions[upf_ids]]
+        )
+        progress = self.rng.uniform(0, 1, size=(2, len(active_ues), 1))
+        positions = starts + progress * (ends - starts)
+        packets["x"] = positions[..., 0]
+        packets["y"] = positions[..., 1]
+        packets["size"] = self.rng.choice(PACKET_SIZES, size=packets.shape)
+
+        # Interleave so the two legs of a UE are adjacent
+        self.packets = packets.T.ravel()
+        return self.packets
+
+    def advance(self, network, dt):
+        """Move the packets in flight dt seconds along their paths
+
+        Unlike generate_packets the packets persist: those that reach their
+        UPF are retired and new ones are injected at a steady rate, keeping
+        about as many in flight as generate_packets draws. dt=0 only refreshes
+        positions, e.g. after a UPF moved. Returns a PACKET_DTYPE array.
+        """
+        key = (network.num_ues, network.num_gnbs, self.active_ratio, self.leg_time)
+        if self.ring is None or self.ring.key != key:
+            self.ring = PacketRing(network, self.active_ratio, self.leg_time, self.rng)
+            self.ring.key = key
+        self.packets = self.ring.advance(network, dt, self.rng)
+        return self.packets
+
+    def reset_flow(self):
+        """Drop the packets in flight, advance starts a fresh flow"""
+        self.ring = None
 
     def set_active_ratio(self, ratio):
         """Set the ratio of active UEs"""
         self.active_ratio = max(0.01, min(1.0, ratio))  # Ensure between 1% and 100%
+
+
+class PacketRing:
+    """Fixed-capacity ring buffer of packets in flight, oldest first
+
+    Every packet spends leg_time on its UE-gNB link and then leg_time on the
+    gNB-UPF link, so packets finish in injection order and retiring them only
+    moves the head. All per-tick work runs in preallocated arrays, including
+    the returned packets, which are a view overwritten by the next advance.
+    """
+
+    def __init__(self, network, active_ratio, leg_time, rng):
+        num_active = max(1, int(active_ratio * network.num_ues))
+        self.leg_time = leg_time
+        self.lifetime = 2 * leg_time
+        # Injection rate (packets/s) that keeps two packets per active UE in flight
+        self.rate = 2 * num_active / self.lifetime
+        self.capacity = 2 * num_active + 2
+        self.key = None
+
+        self.records = np.zeros(self.capacity, dtype=PACKET_DTYPE)
+        self.birth = np.zeros(self.capacity)
+        self.ue_ids = np.zeros(self.capacity, dtype=np.intp)
+        self.gnb_ids = np.zeros(self.capacity, dtype=np.intp)
+        self.upf_ids = np.zeros(self.capacity, dtype=np.intp)
+
+        # Scratch buffers reused on every tick
+        self.phase = np.zeros(self.capacity)
+        self.on_upf_leg = np.zeros(self.capacity, dtype=bool)
+        self.start = np.zeros((self.capacity, 2))
+        self.end = np.zeros((self.capacity, 2))
+        self.upf_xy = np.zeros((self.capacity, 2))
+        self.ramp = np.arange(self.capacity) + 0.5
+        self.new_births = np.zeros(self.capacity)
+        self.draws = np.zeros(self.capacity)
+        self.size_index = np.zeros(self.capacity, dtype=np.intp)
+        self.sizes = np.zeros(self.capacity, dtype=PACKET_SIZES.dtype)
+        # Contiguous copy of the packets when the live region wraps around
+        self.output = np.zeros(self.capacity, dtype=PACKET_DTYPE)
+
+        self.head = 0
+        self.count = 0
+        self.now = 0.0
+        self.carry = 0.0  # fraction of a packet owed to the next injection
+
+        # Start in steady state, with ages spread over a whole lifetime
+        births = np.sort(-self.lifetime * rng.uniform(0, 1, 2 * num_active))
+        self._inject(network, births, rng)
+
+    def advance(self, network, dt, rng):
+        """Advance the clock by dt seconds, retire and inject, return the packets"""
+        self.now += dt
+        self._retire()
+
+        # New packets are born evenly over the tick (never longer ago than a lifetime)
+        span = min(dt, self.lifetime)
+        self.carry += self.rate * span
+        num_new = min(int(self.carry), self.capacity - self.count)
+        self.carry -= int(self.carry)
+        if num_new:
+            births = np.multiply(
+                self.ramp[:num_new], span / num_new, out=self.new_births[:num_new]
+            )
+            births += self.now - span
+            self._inject(network, births, rng)
+
+        self._update_records(network)
+        end = self.head + self.count
+        if end <= self.capacity:
+            return self.records[self.head : end]
+        wrapped = self.capacity - self.head
+        self.output[:wrapped] = self.records[self.head :]
+        self.output[wrapped : self.count] = self.records[: end - self.capacity]
+        return self.output[: self.count]
+
+    def _retire(self):
+        """Move the head past packets older than a lifetime"""
+        limit = self.now - self.lifetime
+        end = self.head + self.count
+        expired = np.searchsorted(
+            self.birth[self.head : min(end, self.capacity)], limit, side="right"
+        )
+        if self.head + expired == self.capacity and end > self.capacity:
+            expired += np.searchsorted(
+                self.birth[: end - self.capacity], limit, side="right"
+            )
+        self.head = (self.head + expired) % self.capacity
+        self.count -= expired
+
+    def _inject(self, network, births, rng):
+        """Append packets born at the (ascending) births from random UEs"""
+        # The new slots form at most two contiguous runs of the ring
+        first = (self.head + self.count) % self.capacity
+        split = min(len(births), self.capacity - first)
+        self._fill(network, slice(first, first + split), births[:split], rng)
+        if split < len(births):
+            self._fill(network, slice(0, len(births) - split), births[split:], rng)
+        self.count += len(births)
+
+    def _fill(self, network, slots, births, rng):
+        """Write new packets into a contiguous run of slots, drawing into scratch"""
+        num_new = len(births)
+        self.birth[slots] = births
+        draws = rng.random(out=self.draws[:num_new])
+        draws *= network.num_ues
+        ue_ids = self.ue_ids[slots]
+        ue_ids[...] = draws  # truncated to uniform ids in [0, num_ues)
+        np.take(network.ue_to_gnb, ue_ids, out=self.gnb_ids[slots], mode="clip")
+
+        rng.random(out=draws)
+        draws *= len(PACKET_SIZES)
+        size_index = self.size_index[:num_new]
+        size_index[...] = draws
+        np.take(PACKET_SIZES, size_index, out=self.sizes[:num_new], mode="clip")
+        self.records["size"][slots] = self.sizes[:num_new]
+
+    def _update_records(self, network):
+        """Recompute link, endpoints and position of every slot in place
+
+        Free slots are computed too, which is cheaper than masking them out.
+        Serving UPFs are looked up each tick so packets follow re-associations.
+        """
+        progress = np.subtract(self.now, self.birth, out=self.phase)
+        progress /= self.leg_time
+        on_upf_leg = np.greater_equal(progress, 1.0, out=self.on_upf_leg)
+        np.subtract(progress, 1.0, out=progress, where=on_upf_leg)
+        # Indices are valid; mode="clip" lets take write to out without a copy
+        np.take(network.gnb_to_upf, self.gnb_ids, out=self.upf_ids, mode="clip")
+
+        # Type codes are consecutive, so the second leg is the first shifted by one
+        records = self.records
+        leg_offset = on_upf_leg.view(np.int8)
+        np.add(leg_offset, UE, out=records["source_type"])
+        np.add(leg_offset, GNB, out=records["target_type"])
+        records["source_id"] = self.ue_ids
+        np.copyto(
+            records["source_id"], self.gnb_ids, where=on_upf_leg, casting="unsafe"
+        )
+        records["target_id"] = self.gnb_ids
+        np.copyto(
+            records["target_id"], self.upf_ids, where=on_upf_leg, casting="unsafe"
+        )
+
+        # Whole rows are gathered, taking a column would copy the position table
+        start = np.take(
+            network.ue_positions, self.ue_ids, axis=0, out=self.start, mode="clip"
+        )
+        end = np.take(
+            network.gnb_positions, self.gnb_ids, axis=0, out=self.end, mode="clip"
+        )
+        np.copyto(start, end, where=on_upf_leg[:, None])
+        upf_xy = np.take(
+            network.upf_positions, self.upf_ids, axis=0, out=self.upf_xy, mode="clip"
+        )
+        np.copyto(end, upf_xy, where=on_upf_leg[:, None])
+
+        # start + progress * (end - start)
+        end -= start
+        end *= progress[:, None]
+        end += start
+        records["x"] = end[:, 0]
+        records["y"] = end[:, 1]
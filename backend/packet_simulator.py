@@ -0,0 +1,233 @@
+import heapq
+from collections import deque
+
+import numpy as np
+
+# Event kinds of the reference engine, in the order a packet goes through them
+ARRIVE_GNB, DEPART_GNB, ARRIVE_UPF, DEPART_UPF = range(4)
+
+
+class PacketSimulator:
+    """Discrete-event simulation of packets travelling UE -> gNB -> UPF
+
+    Every gNB and UPF is a single FIFO server with a fixed service time per
+    packet; links add the LatencyCalculator air and fronthaul delays. Server
+    free times and the latency histogram persist between calls, so traffic can
+    be fed in consecutive chunks (in send-time order) of any size. Packets
+    still in flight across a chunk boundary are queued after the previous
+    chunk, which only matters when links reorder them (sub-microsecond here).
+    """
+
+    def __init__(
+        self,
+        latency_calculator,
+        gnb_service_time=None,
+        upf_service_time=0.0,
+        bin_width=1e-3,
+        max_latency=10.0,
+    ):
+        self.latency_calculator = latency_calculator
+        # Service time (ms) per packet, the gNB defaults to the base processing delay
+        if gnb_service_time is None:
+            gnb_service_time = latency_calculator.base_processing_delay
+        self.gnb_service_time = gnb_service_time
+        self.upf_service_time = upf_service_time
+
+        # Latency histogram (ms), the last bin counts everything >= max_latency
+        self.bin_width = bin_width
+        self.num_bins = int(round(max_latency / bin_width))
+        self.reset()
+
+    def reset(self):
+        """Empty all queues and forget the recorded latencies"""
+        self.gnb_free = None  # time (ms) each gNB server becomes idle
+        self.upf_free = None
+        self.histogram = np.zeros(self.num_bins + 1, dtype=np.int64)
+        self.num_delivered = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.first_send = np.inf
+        self.last_delivery = -np.inf
+        self.num_events = 0
+
+    def simulate(self, network, send_times, ue_ids):
+        """Deliver the packets sent by ue_ids at send_times (ms), batched
+
+        Each server's departures follow from the Lindley recursion
+        d_k = max(a_k, d_{k-1}) + s, evaluated for all packets of a node at
+        once with a running maximum. Returns per-packet latencies and
+        delivery times in the order of the input.
+        """
+        send_times = np.asarray(send_times, dtype=np.float64)
+        ue_ids = np.asarray(ue_ids, dtype=np.intp)
+        air_delay, fronthaul_delay, gnb_ids, upf_ids = self._paths(network, ue_ids)
+
+        gnb_departure = _fifo_departures(
+            send_times + air_delay[ue_ids],
+            gnb_ids,
+            self.gnb_service_time,
+            self.gnb_free,
+        )
+        delivery_times = _fifo_departures(
+            gnb_departure + fronthaul_delay[gnb_ids],
+            upf_ids,
+            self.upf_service_time,
+            self.upf_free,
+        )
+        self.num_events += 4 * len(ue_ids)
+        return self._record(send_times, delivery_times)
+
+    def simulate_reference(self, network, send_times, ue_ids):
+        """Event-by-event version of simulate driven by a heap of pending events
+
+        Slow, but a direct transcription of the queueing model that simulate
+        is checked against. Simultaneous events are handled in packet order.
+        """
+        send_times = np.asarray(send_times, dtype=np.float64)
+        ue_ids = np.asarray(ue_ids, dtype=np.intp)
+        air_delay, fronthaul_delay, gnb_ids, upf_ids = self._paths(network, ue_ids)
+
+        nodes = {
+            ARRIVE_GNB: (gnb_ids, self.gnb_free, self.gnb_service_time),
+            ARRIVE_UPF: (upf_ids, self.upf_free, self.upf_service_time),
+        }
+        queues = {ARRIVE_GNB: {}, ARRIVE_UPF: {}}  # waiting packets per busy node
+        delivery_times = np.empty_like(send_times)
+
+        events = [
+            (send_time + air_delay[ue_id], packet, ARRIVE_GNB)
+            for packet, (send_time, ue_id) in enumerate(zip(send_times, ue_ids))
+        ]
+        heapq.heapify(events)
+        while events:
+            time, packet, kind = heapq.heappop(events)
+            self.num_events += 1
+            stage = kind if kind in queues else kind - 1
+            node_ids, free, service_time = nodes[stage]
+            node = node_ids[packet]
+            waiting = queues[stage]
+
+            if kind == ARRIVE_GNB or kind == ARRIVE_UPF:
+                if node in waiting:
+                    waiting[node].append(packet)
+                else:
+                    waiting[node] = deque()
+                    start = max(time, free[node])
+                    heapq.heappush(events, (start + service_time, packet, kind + 1))
+                continue
+
+            # Departure: release the server to the next packet in line
+            free[node] = time
+            if waiting[node]:
+                next_packet = waiting[node].popleft()
+                heapq.heappush(events, (time + service_time, next_packet, kind))
+            else:
+                del waiting[node]
+
+            if kind == DEPART_GNB:
+                arrival = time + fronthaul_delay[gnb_ids[packet]]
+                heapq.heappush(events, (arrival, packet, ARRIVE_UPF))
+            else:
+                delivery_times[packet] = time
+
+        return self._record(send_times, delivery_times)
+
+    def get_simulation_stats(self):
+        """Empirical latency distribution and throughput of everything simulated
+
+        Percentiles falling in the overflow bin (>= max_latency) are inf.
+        """
+        if self.num_delivered == 0:
+            return None
+
+        # Percentiles are read from the histogram as upper bin edges
+        cumulative = np.cumsum(self.histogram)
+        percentiles = {}
+        for name, q in (("p50", 0.5), ("p99", 0.99), ("p999", 0.999)):
+            rank = int(np.ceil(q * self.num_delivered))
+            bin_index = np.searchsorted(cumulative, rank)
+            if bin_index >= self.num_bins:
+                percentiles[name] = np.inf
+            else:
+                percentiles[name] = min(
+                    (bin_index + 1) * self.bin_width, self.latency_max
+                )
+
+        duration = self.last_delivery - self.first_send
+        # URLLC target is 1ms, with max_latency below that only the packets
+        # under max_latency are known to meet it
+        urllc_bins = min(int(round(1.0 / self.bin_width)), self.num_bins)
+        return {
+            "packets": self.num_delivered,
+            "average": self.latency_sum / self.num_delivered,
+            **percentiles,
+            "maximum": self.latency_max,
+            "urllc_fraction": cumulative[urllc_bins - 1] / self.num_delivered,
+            "throughput": self.num_delivered / duration * 1000 if duration > 0 else 0.0,
+            "events": self.num_events,
+        }
+
+    def _paths(self, network, ue_ids):
+        """Per-UE air delay, per-gNB fronthaul delay and the nodes each packet visits"""
+        air_dist, fronthaul_dist = network.serving_distances(
+            network.ue_gnb_dist, network.gnb_upf_dist
+        )
+        air_delay, fronthaul_delay = self.latency_calculator.link_delays(
+            air_dist, fronthaul_dist
+        )
+
+        if self.gnb_free is None or len(self.gnb_free) != network.num_gnbs:
+            self.gnb_free = np.zeros(network.num_gnbs)
+        if self.upf_free is None or len(self.upf_free) != network.num_upfs:
+            self.upf_free = np.zeros(network.num_upfs)
+
+        gnb_ids = network.ue_to_gnb[ue_ids]
+        return air_delay, fronthaul_delay, gnb_ids, network.gnb_to_upf[gnb_ids]
+
+    def _record(self, send_times, delivery_times):
+        """Add delivered packets to the running statistics"""
+        latencies = delivery_times - send_times
+        if len(latencies):
+            bins = np.minimum(latencies / self.bin_width, self.num_bins).astype(np.intp)
+            self.histogram += np.bincount(bins, minlength=self.num_bins + 1)
+            self.num_delivered += len(latencies)
+            self.latency_sum += float(np.sum(latencies))
+            self.latency_max = max(self.latency_max, float(np.max(latencies)))
+            self.first_send = min(self.first_send, float(np.min(send_times)))
+            self.last_delivery = max(self.last_delivery, float(np.max(delivery_times)))
+        return {"latencies": latencies, "delivery_times": delivery_times}
+
+
+def _fifo_departures(arrivals, nodes, service_time, free):
+    """Departure times of packets arriving at single-server FIFO nodes
+
+    free holds the time each node becomes idle and is advanced in place. With
+    a_k the k-th arrival at a node (k from 0) and s the service time, the
+    recursion unrolls to d_k = (k + 1) s + max(free, max_{j<=k} (a_j - j s)).
+    """
+    if len(arrivals) == 0:
+        return np.empty(0)
+
+    # Group by node, arrival order within a node (stable, so ties keep packet order)
+    order = np.lexsort((arrivals, nodes))
+    sorted_nodes = nodes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_nodes[1:] != sorted_nodes[:-1]])
+    counts = np.diff(np.r_[starts, len(order)])
+    position = np.arange(len(order)) - np.repeat(starts, counts)
+    slack = arrivals[order] - position * service_time
+
+    # Running max restarted per node: offsetting each group above all earlier
+    # ones makes the first element of a group a new record. The offset only
+    # locates the records, their values are read back unshifted.
+    span = slack.max() - slack.min() + 1.0
+    shifted = slack + np.repeat(np.arange(len(starts)) * span, counts)
+    records = shifted == np.maximum.accumulate(shifted)
+    best = slack[np.maximum.accumulate(np.where(records, np.arange(len(order)), 0))]
+
+    sorted_departures = np.maximum(best, free[sorted_nodes])
+    sorted_departures += (position + 1) * service_time
+    free[sorted_nodes[starts + counts - 1]] = sorted_departures[starts + counts - 1]
+
+    departures = np.empty_like(sorted_departures)
+    departures[order] = sorted_departures
+    return departures
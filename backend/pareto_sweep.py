@@ -0,0 +1,171 @@
+import copy
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from backend.upf_optimizer import UPFOptimizer
+
+# Columns of the compact frontier table
+FRONTIER_COLUMNS = [
+    "num_upfs",
+    "latency_p99",
+    "reliability_minimum",
+    "latency_average",
+    "reliability_average",
+]
+
+
+class ParetoSweep:
+    """Sweeps the number of UPFs and extracts the latency/reliability Pareto frontier"""
+
+    def __init__(self, results_path=None, strategy="kmeans", n_jobs=None, **options):
+        # The sweep sets the UPF count, strategies that choose it would produce
+        # the same placement for every count
+        if strategy in UPFOptimizer.COUNT_CHOOSING:
+            raise ValueError(f"Strategy {strategy!r} chooses its own number of UPFs")
+        if "num_upfs" in options:
+            raise ValueError("num_upfs is set by the sweep, not an option")
+        # JSON lines file the rows are appended to as they complete
+        self.results_path = results_path
+        self.strategy = strategy  # a fixed-count UPFOptimizer strategy
+        self.options = options
+        self.n_jobs = n_jobs
+
+    def run(self, network, min_upfs=1, max_upfs=16, progress=None):
+        """Place and evaluate every UPF count in [min_upfs, max_upfs]
+
+        Counts already stored in results_path for the same network and strategy
+        are not recomputed, so an interrupted sweep resumes where it stopped.
+        progress(fraction, message) is called after every stored row (e.g.
+        Job.report, which also stops the sweep when its job is cancelled).
+        Returns all rows as a DataFrame with a boolean "pareto" column.
+        """
+        signature = self._signature(network)
+        rows = {
+            row["num_upfs"]: row
+            for row in self._load_rows()
+            if row["signature"] == signature and min_upfs <= row["num_upfs"] <= max_upfs
+        }
+        pending = [k for k in range(min_upfs, max_upfs + 1) if k not in rows]
+        num_counts = max_upfs - min_upfs + 1
+
+        def store(row):
+            rows[row["num_upfs"]] = self._store_row(row, signature)
+            if progress is not None:
+                progress(len(rows) / num_counts, f"{row['num_upfs']} UPFs done")
+
+        n_jobs = min(self.n_jobs or os.cpu_count() or 1, max(1, len(pending)))
+        if n_jobs == 1:
+            for num_upfs in pending:
+                store(_sweep_point(network, num_upfs, self.strategy, self.options))
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = [
+                    executor.submit(
+                        _sweep_point, network, num_upfs, self.strategy, self.options
+                    )
+                    for num_upfs in pending
+                ]
+                try:
+                    for future in as_completed(futures):
+                        store(future.result())
+                except BaseException:
+                    # Do not start the remaining points when stopped early
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        results = pd.DataFrame([rows[k] for k in sorted(rows)])
+        results["pareto"] = pareto_mask(results)
+        return results
+
+    def frontier(self, network, min_upfs=1, max_upfs=16):
+        """Run the sweep and return only the Pareto-optimal rows, compactly"""
+        results = self.run(network, min_upfs, max_upfs)
+        return results.loc[results["pareto"], FRONTIER_COLUMNS].reset_index(drop=True)
+
+    def _signature(self, network):
+        """Stable identifier of the UE/gNB layout and sweep settings"""
+        digest = hashlib.blake2b(digest_size=16)
+        for positions in (network.ue_positions, network.gnb_positions):
+            digest.update(np.ascontiguousarray(positions).tobytes())
+        digest.update(json.dumps(self.strategy).encode())
+        for name, value in sorted(self.options.items()):
+            digest.update(name.encode())
+            # Arrays (e.g. candidate_sites) are hashed by content
+            if isinstance(value, np.ndarray):
+                digest.update(f"{value.dtype}{value.shape}".encode())
+                digest.update(np.ascontiguousarray(value).tobytes())
+            else:
+                digest.update(json.dumps(value, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _load_rows(self):
+        if not self.results_path or not os.path.exists(self.results_path):
+            return []
+        with open(self.results_path) as results_file:
+            lines = results_file.read().split("\n")
+
+        # A sweep killed mid-write can leave a truncated last line, terminate it
+        # so the next appended row starts on its own line
+        if lines[-1]:
+            with open(self.results_path, "a") as results_file:
+                results_file.write("\n")
+
+        rows = []
+        for line in lines:
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return rows
+
+    def _store_row(self, row, signature):
+        row = {**row, "signature": signature}
+        if self.results_path:
+            with open(self.results_path, "a") as results_file:
+                results_file.write(json.dumps(row) + "\n")
+                results_file.flush()
+                os.fsync(results_file.fileno())
+        return row
+
+
+def pareto_mask(results):
+    """Rows not dominated on (fewer UPFs, lower p99 latency, higher min reliability)"""
+    costs = np.column_stack(
+        [
+            results["num_upfs"].to_numpy(dtype=float),
+            results["latency_p99"].to_numpy(dtype=float),
+            -results["reliability_minimum"].to_numpy(dtype=float),
+        ]
+    )
+    no_worse = np.all(costs[:, None] <= costs[None], axis=2)
+    better = np.any(costs[:, None] < costs[None], axis=2)
+    dominated = np.any(no_worse & better, axis=0)
+    return ~dominated
+
+
+def _sweep_point(network, num_upfs, strategy, options):
+    """Place num_upfs UPFs on a private copy of network and summarize the metrics"""
+    network = copy.deepcopy(network)
+    network.num_upfs = num_upfs
+    optimizer = UPFOptimizer()
+    optimizer.optimize(network, strategy, **options)
+    metrics = optimizer.metrics_engine.evaluate(
+        network, network.ue_gnb_dist, network.gnb_upf_dist
+    )
+    latencies, reliabilities = metrics["latencies"], metrics["reliabilities"]
+
+    return {
+        "num_upfs": num_upfs,
+        "latency_p99": float(np.percentile(latencies, 99)),
+        "latency_average": float(np.mean(latencies)),
+        "latency_maximum": float(np.max(latencies)),
+        "reliability_minimum": float(np.min(reliabilities)),
+        "reliability_average": float(np.mean(reliabilities)),
+        "upf_positions": np.asarray(network.upf_positions).tolist(),
+    }
@@ -0,0 +1,181 @@
+import functools
+import threading
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+# Histogram bucket edges in seconds, two per decade from 10 us to 10 s
+HISTOGRAM_EDGES = np.logspace(-5, 1, 13)
+
+# Returned by a disabled profiler, so an untimed stage costs one attribute
+# check and an empty with-block
+_UNTIMED = nullcontext()
+
+
+class StageStats:
+    """Call count, total time and the last window durations of one stage"""
+
+    def __init__(self, window):
+        self.calls = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.last = 0.0
+        self.samples = np.zeros(window)  # ring buffer of recent durations (s)
+
+    def record(self, seconds):
+        self.samples[self.calls % len(self.samples)] = seconds
+        self.calls += 1
+        self.total += seconds
+        self.last = seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def recent(self):
+        """Durations of the latest calls (at most window), oldest first"""
+        if self.calls <= len(self.samples):
+            return self.samples[: self.calls].copy()
+        start = self.calls % len(self.samples)
+        return np.concatenate([self.samples[start:], self.samples[:start]])
+
+
+class _StageTimer:
+    __slots__ = ("profiler", "name", "started")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class StageProfiler:
+    """Per-stage wall-clock timers, call counts and rolling latency histograms
+
+    Stages are timed with `with profiler.stage(name):` or the profiled
+    decorator; nested stages are timed inclusively. While disabled (the
+    default) nothing is measured or stored. Safe to use from several threads.
+    """
+
+    def __init__(self, enabled=False, window=512):
+        self.enabled = enabled
+        self.window = window  # durations kept per stage for percentiles
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Components are pickled into worker processes, whose timings stay there
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """Forget all recorded timings"""
+        with self._lock:
+            self.stages = {}
+
+    def stage(self, name):
+        """Context manager timing one call of the named stage"""
+        if not self.enabled:
+            return _UNTIMED
+        return _StageTimer(self, name)
+
+    def timed(self, name):
+        """Decorator timing every call of a plain function as the named stage"""
+
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorate
+
+    def record(self, name, seconds):
+        """Add a duration measured elsewhere to the named stage"""
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats(self.window)
+            stats.record(seconds)
+
+    def histogram(self, name, edges=HISTOGRAM_EDGES):
+        """Counts of the stage's recent durations per bucket between edges (s)
+
+        Durations outside the edges are counted in the first or last bucket.
+        """
+        with self._lock:
+            recent = self.stages[name].recent()
+        recent = np.clip(recent, edges[0], edges[-1])
+        return np.histogram(recent, bins=edges)[0]
+
+    def report(self):
+        """Summary of every stage as {name: stats}, times in milliseconds
+
+        Percentiles are over the recent window; calls, total and maximum are
+        since the last reset.
+        """
+        with self._lock:
+            snapshot = {
+                name: (
+                    stats.calls,
+                    stats.total,
+                    stats.last,
+                    stats.maximum,
+                    stats.recent(),
+                )
+                for name, stats in self.stages.items()
+            }
+
+        report = {}
+        for name, (calls, total, last, maximum, recent) in sorted(snapshot.items()):
+            p50, p95, p99 = np.percentile(recent, [50, 95, 99]) * 1000
+            report[name] = {
+                "calls": calls,
+                "total": total * 1000,
+                "mean": total / calls * 1000,
+                "last": last * 1000,
+                "p50": p50,
+                "p95": p95,
+                "p99": p99,
+                "maximum": maximum * 1000,
+            }
+        return report
+
+
+def profiled(name):
+    """Decorator timing a method as the named stage of self.profiler"""
+
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.profiler.enabled:
+                return method(self, *args, **kwargs)
+            with self.profiler.stage(name):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+# Shared by the components unless they are given their own, so the backend,
+# the visualizer and the dashboard report into one place
+default_profiler = StageProfiler()
@@ -10,35 +10,56 @@ class ReliabilityAnalyzer:
         self.distance_reliability_factor = 0.01  # Reliability degrades with distance
         self.base_reliability = 0.99999  # Base reliability at optimal conditions
 
-    def calculate_reliability(self, network, ue_gnb_dist, gnb_upf_dist):
-        """Calculate reliability metrics for all UEs based on distances and network conditions"""
-        reliabilities = []
-
-        for ue_id in range(network.num_ues):
-            gnb_id = network.ue_to_gnb[ue_id]
-            upf_id = network.gnb_to_upf[gnb_id]
-
-            # Air interface reliability (decreases with distance)
-            air_distance = ue_gnb_dist[ue_id, gnb_id]
-            air_reliability = self.base_reliability * np.exp(
-                -self.distance_reliability_factor * air_distance
-            )
+    def calculate_reliability(self, network, ue_gnb_dist, gnb_upf_dist, ue_ids=None):
+        """Calculate reliability metrics for all UEs based on distances and network conditions
+
+        Accepts the dense distance matrices or the sparse serving-distance vectors,
+        optionally restricted to the UEs in ue_ids.
+        """
+        air_dist, fronthaul_dist = network.serving_distances(ue_gnb_dist, gnb_upf_dist)
+        ue_to_gnb = network.ue_to_gnb
+        if ue_ids is not None:
+            air_dist = air_dist[ue_ids]
+            ue_to_gnb = ue_to_gnb[ue_ids]
+
+        ues_per_gnb = np.bincount(network.ue_to_gnb, minlength=network.num_gnbs)
+        load_share = ues_per_gnb[ue_to_gnb] / network.num_ues
+
+        return self.compute_reliabilities(
+            air_dist, fronthaul_dist[ue_to_gnb], load_share
+        )
+
+    def compute_reliabilities(
+        self, air_distance, fronthaul_distance, load_share, log_space=False
+    ):
+        """Reliabilities from per-UE air and fronthaul distances and serving gNB load share
+
+        With log_space=True the natural log of the reliability is returned, which
+        keeps products of five-nines factors exact enough to compare against 1.
+        """
+        # Load-based reliability factor
+        load_factor = np.maximum(0.99, 1 - load_share * 0.01)
 
-            # Fronthaul reliability (decreases with distance)
-            fronthaul_distance = gnb_upf_dist[gnb_id, upf_id]
-            fronthaul_reliability = self.base_reliability * np.exp(
-                -self.distance_reliability_factor * fronthaul_distance * 0.5
+        if log_space:
+            log_reliability = 2 * np.log(self.base_reliability) + np.log(load_factor)
+            log_reliability -= self.distance_reliability_factor * air_distance
+            log_reliability -= (
+                self.distance_reliability_factor * fronthaul_distance * 0.5
             )
+            return log_reliability
 
-            # Load-based reliability factor
-            ues_per_gnb = np.sum(network.ue_to_gnb == gnb_id)
-            load_factor = max(0.99, 1 - (ues_per_gnb / network.num_ues) * 0.01)
+        # Air interface reliability (decreases with distance)
+        air_reliability = self.base_reliability * np.exp(
+            -self.distance_reliability_factor * air_distance
+        )
 
-            # Combined reliability (product of all reliability factors)
-            total_reliability = air_reliability * fronthaul_reliability * load_factor
-            reliabilities.append(total_reliability)
+        # Fronthaul reliability (decreases with distance)
+        fronthaul_reliability = self.base_reliability * np.exp(
+            -self.distance_reliability_factor * fronthaul_distance * 0.5
+        )
 
-        return np.array(reliabilities)
+        # Combined reliability (product of all reliability factors)
+        return air_reliability * fronthaul_reliability * load_factor
 
     def get_reliability_stats(self, reliabilities):
         """Calculate statistics for the reliabilities"""
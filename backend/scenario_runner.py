@@ -0,0 +1,195 @@
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backend.network_manager import NetworkManager
+from backend.upf_optimizer import UPFOptimizer
+
+# Scenario parameters and their defaults, those before active_ratio define the
+# topology and are expanded outermost so neighbouring scenarios share it
+SCENARIO_DEFAULTS = {
+    "seed": 42,
+    "num_ues": 15,
+    "num_gnbs": 5,
+    "num_upfs": 3,
+    "association_mode": "dense",
+    "active_ratio": 0.3,
+    "strategy": "none",  # UPFOptimizer strategy, "none" keeps the initial layout
+}
+TOPOLOGY_KEYS = ("seed", "num_ues", "num_gnbs", "num_upfs", "association_mode")
+
+# NetworkManagers kept by each worker process, keyed by topology parameters
+_worker_managers = {}
+_MAX_WORKER_MANAGERS = 4
+
+
+def expand_grid(grid):
+    """Scenarios for every combination of the grid values, as a list of dicts
+
+    grid maps SCENARIO_DEFAULTS keys to a value or a list of values; missing
+    keys take their default. None (e.g. seed=None for fresh entropy) is a
+    single value.
+    """
+    unknown = set(grid) - set(SCENARIO_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown scenario parameters: {sorted(unknown)}")
+
+    axes = []
+    for key, default in SCENARIO_DEFAULTS.items():
+        values = grid.get(key, default)
+        if values is None or isinstance(values, (str, int, float)):
+            values = [values]
+        axes.append(list(values))
+
+    return [
+        {"scenario_id": scenario_id, **dict(zip(SCENARIO_DEFAULTS, values))}
+        for scenario_id, values in enumerate(itertools.product(*axes))
+    ]
+
+
+def run_scenario(scenario):
+    """Run one scenario through a NetworkManager and summarize it as a flat row
+
+    Managers are reused across scenarios with the same topology parameters
+    (within a process); each run starts again from the initial UPF layout,
+    including its UPF count, which RESIZING strategies change.
+    """
+    started = time.perf_counter()
+    manager, initial_upf_positions = _worker_manager(scenario)
+    manager.topology.num_upfs = len(initial_upf_positions)
+    # Marks the associations stale, they are recomputed for the initial layout
+    manager.topology.upf_positions = initial_upf_positions.copy()
+    manager.upf_optimizer = UPFOptimizer(manager.metrics_engine)
+    manager.packet_generator.set_active_ratio(scenario["active_ratio"])
+
+    if scenario["strategy"] != "none":
+        manager.optimize_upf_placement(scenario["strategy"])
+    stats = manager.get_metric_stats()
+    # Packets drawn the same whatever ran before in this worker
+    manager.reset_packet_stream()
+    packets = manager.packet_data
+
+    latency_stats = stats["latency_stats"]
+    reliability_stats = stats["reliability_stats"]
+    return {
+        **scenario,
+        # RESIZING strategies choose their own count, num_upfs is the request
+        "num_upfs_placed": manager.topology.num_upfs,
+        "latency_average": float(latency_stats["average"]),
+        "latency_minimum": float(latency_stats["minimum"]),
+        "latency_maximum": float(latency_stats["maximum"]),
+        "latency_p99": float(np.percentile(manager.latencies, 99)),
+        "urllc_latency_achieved": bool(latency_stats["urllc_target_achieved"]),
+        "reliability_average": float(reliability_stats["average"]),
+        "reliability_minimum": float(reliability_stats["minimum"]),
+        "reliability_maximum": float(reliability_stats["maximum"]),
+        "urllc_reliability_achieved": bool(reliability_stats["urllc_target_achieved"]),
+        "packets_in_flight": len(packets),
+        "elapsed": time.perf_counter() - started,
+    }
+
+
+def run_scenarios(scenarios, output_path, n_jobs=None, batch_size=256):
+    """Run scenarios (a list or a grid dict) and stream the rows to output_path
+
+    The format follows the extension: .csv, or .parquet (needs pyarrow).
+    Scenarios are fanned out over n_jobs processes in topology-sharing
+    chunks and rows are written in batches of batch_size, in scenario order,
+    so memory does not grow with the number of scenarios. Returns the number
+    of rows written.
+    """
+    if isinstance(scenarios, dict):
+        scenarios = expand_grid(scenarios)
+    writer = _ResultWriter(output_path)
+    n_jobs = min(n_jobs or os.cpu_count() or 1, max(1, len(scenarios)))
+
+    try:
+        if n_jobs == 1:
+            rows = map(run_scenario, scenarios)
+            _write_batches(writer, rows, batch_size)
+        else:
+            # Contiguous chunks keep scenarios with the same topology on one worker
+            chunksize = max(1, min(batch_size, len(scenarios) // (4 * n_jobs)))
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                rows = executor.map(run_scenario, scenarios, chunksize=chunksize)
+                _write_batches(writer, rows, batch_size)
+    finally:
+        writer.close()
+    return writer.rows_written
+
+
+def _worker_manager(scenario):
+    key = tuple(scenario[name] for name in TOPOLOGY_KEYS)
+    if key not in _worker_managers:
+        if len(_worker_managers) >= _MAX_WORKER_MANAGERS:
+            _worker_managers.pop(next(iter(_worker_managers)))
+        manager = NetworkManager(
+            scenario["num_ues"],
+            scenario["num_gnbs"],
+            scenario["num_upfs"],
+            association_mode=scenario["association_mode"],
+            seed=scenario["seed"],
+        )
+        _worker_managers[key] = (manager, manager.topology.upf_positions.copy())
+    return _worker_managers[key]
+
+
+def _write_batches(writer, rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            writer.write(batch)
+            batch = []
+    if batch:
+        writer.write(batch)
+
+
+class _ResultWriter:
+    """Appends batches of result rows to a CSV or Parquet file"""
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.format = os.path.splitext(output_path)[1].lower().lstrip(".")
+        if self.format not in ("csv", "parquet"):
+            raise ValueError(f"Unsupported output format: {output_path}")
+        if self.format == "parquet":
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError as error:
+                raise ImportError(
+                    "Parquet output needs pyarrow (pip install pyarrow), "
+                    "or write to a .csv path instead"
+                ) from error
+            self._pyarrow = pyarrow
+        self.parquet_writer = None
+        self.rows_written = 0
+
+    def write(self, rows):
+        frame = pd.DataFrame(rows)
+        if self.format == "csv":
+            frame.to_csv(
+                self.output_path,
+                mode="w" if self.rows_written == 0 else "a",
+                header=self.rows_written == 0,
+                index=False,
+            )
+        else:
+            table = self._pyarrow.Table.from_pandas(frame, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = self._pyarrow.parquet.ParquetWriter(
+                    self.output_path, table.schema
+                )
+            else:
+                table = table.cast(self.parquet_writer.schema)
+            self.parquet_writer.write_table(table)
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
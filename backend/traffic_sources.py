@@ -0,0 +1,166 @@
+import numpy as np
+
+
+class PoissonSource:
+    """Independent Poisson traffic from each UE of a slice
+
+    rate is in packets per second, either one value for every UE in ue_ids or
+    one per UE. rng may be a np.random.Generator or a seed.
+    """
+
+    def __init__(self, ue_ids, rate, rng=None):
+        self.ue_ids = np.asarray(ue_ids, dtype=np.intp)
+        self.rates = np.broadcast_to(np.asarray(rate, dtype=float), self.ue_ids.shape)
+        self.rng = np.random.default_rng(rng)
+        # Superposition: one Poisson stream, each arrival drawn from a UE by rate
+        self.cumulative = np.cumsum(self.rates) / np.sum(self.rates)
+
+    @property
+    def mean_rate(self):
+        """Expected packets per second of the whole slice"""
+        return float(np.sum(self.rates))
+
+    def window(self, start, end):
+        """Arrivals (send times in ms, UE ids) in [start, end)"""
+        count = self.rng.poisson(self.mean_rate * (end - start) / 1000)
+        times = np.sort(start + self.rng.random(count) * (end - start))
+        picks = np.searchsorted(self.cumulative, self.rng.random(count), side="right")
+        return times, self.ue_ids[np.minimum(picks, len(self.ue_ids) - 1)]
+
+
+class PeriodicSource:
+    """URLLC-style periodic traffic, one packet per UE every period ms
+
+    Each UE sends at its own phase within the period, drawn uniformly unless
+    offsets (ms) are given.
+    """
+
+    def __init__(self, ue_ids, period, offsets=None, rng=None):
+        self.ue_ids = np.asarray(ue_ids, dtype=np.intp)
+        self.periods = np.broadcast_to(
+            np.asarray(period, dtype=float), self.ue_ids.shape
+        )
+        self.rng = np.random.default_rng(rng)
+        if offsets is None:
+            offsets = self.rng.random(len(self.ue_ids)) * self.periods
+        self.offsets = np.broadcast_to(
+            np.asarray(offsets, dtype=float), self.ue_ids.shape
+        )
+
+    @property
+    def mean_rate(self):
+        """Expected packets per second of the whole slice"""
+        return float(np.sum(1000 / self.periods))
+
+    def window(self, start, end):
+        """Arrivals (send times in ms, UE ids) in [start, end)"""
+        # Send indices k with offset + k * period in [start, end), per UE
+        first = np.ceil((start - self.offsets) / self.periods).astype(np.int64)
+        counts = np.ceil((end - self.offsets) / self.periods).astype(np.int64) - first
+        counts = np.maximum(counts, 0)
+
+        sender = np.repeat(np.arange(len(self.ue_ids)), counts)
+        index = np.arange(len(sender)) - np.repeat(np.cumsum(counts) - counts, counts)
+        times = self.offsets[sender] + (first[sender] + index) * self.periods[sender]
+
+        order = np.argsort(times, kind="stable")
+        return times[order], self.ue_ids[sender[order]]
+
+
+class OnOffSource:
+    """Bursty traffic: each UE alternates exponential on and off periods
+
+    While on a UE sends Poisson traffic at rate_on packets per second; mean_on
+    and mean_off are the mean period lengths in ms. UE states carry over from
+    one window to the next, so windows must be requested consecutively.
+    """
+
+    def __init__(self, ue_ids, rate_on, mean_on, mean_off, rng=None):
+        self.ue_ids = np.asarray(ue_ids, dtype=np.intp)
+        self.rate_on = rate_on
+        self.mean_on = mean_on
+        self.mean_off = mean_off
+        self.rng = np.random.default_rng(rng)
+
+        # Start in the stationary distribution, residual periods are memoryless
+        num_ues = len(self.ue_ids)
+        self.on = self.rng.random(num_ues) < mean_on / (mean_on + mean_off)
+        self.next_toggle = self.rng.exponential(self._mean_periods(self.on))
+
+    @property
+    def mean_rate(self):
+        """Expected packets per second of the whole slice"""
+        duty_cycle = self.mean_on / (self.mean_on + self.mean_off)
+        return float(len(self.ue_ids) * self.rate_on * duty_cycle)
+
+    def window(self, start, end):
+        """Arrivals (send times in ms, UE ids) in [start, end)"""
+        # Collect the on intervals inside the window, one toggle per UE per round
+        senders, interval_starts, interval_ends = [], [], []
+        current = np.full(len(self.ue_ids), float(start))
+        pending = np.arange(len(self.ue_ids))
+        while len(pending):
+            stop = np.minimum(self.next_toggle[pending], end)
+            sending = self.on[pending]
+            senders.append(pending[sending])
+            interval_starts.append(current[pending][sending])
+            interval_ends.append(stop[sending])
+
+            # UEs that toggle before the window ends go round again
+            pending = pending[self.next_toggle[pending] < end]
+            current[pending] = self.next_toggle[pending]
+            self.on[pending] = ~self.on[pending]
+            self.next_toggle[pending] += self.rng.exponential(
+                self._mean_periods(self.on[pending])
+            )
+
+        senders = np.concatenate(senders)
+        interval_starts = np.concatenate(interval_starts)
+        lengths = np.concatenate(interval_ends) - interval_starts
+
+        # Poisson arrivals within each on interval
+        counts = self.rng.poisson(self.rate_on * lengths / 1000)
+        interval = np.repeat(np.arange(len(counts)), counts)
+        times = (
+            interval_starts[interval]
+            + self.rng.random(len(interval)) * lengths[interval]
+        )
+
+        order = np.argsort(times, kind="stable")
+        return times[order], self.ue_ids[senders[interval[order]]]
+
+    def _mean_periods(self, on):
+        return np.where(on, self.mean_on, self.mean_off)
+
+
+def traffic_chunks(sources, chunk_size=65536, duration=None):
+    """Yield (send_times, ue_ids) chunks of chunk_size packets in send-time order
+
+    The sources (one per slice) are advanced together through windows sized
+    to produce about one chunk each, so memory stays bounded by a couple of
+    chunks however long the simulated duration (ms). duration=None generates
+    forever; otherwise the final chunk may be shorter.
+    """
+    window = chunk_size / sum(source.mean_rate for source in sources) * 1000
+    buffered_times = np.empty(0)
+    buffered_ues = np.empty(0, dtype=np.intp)
+
+    start = 0.0
+    while duration is None or start < duration:
+        end = start + window if duration is None else min(start + window, duration)
+        arrivals = [source.window(start, end) for source in sources]
+        times = np.concatenate([times for times, _ in arrivals])
+        ue_ids = np.concatenate([ue_ids for _, ue_ids in arrivals])
+        order = np.argsort(times, kind="stable")
+
+        # Buffered arrivals are all earlier than the new window
+        buffered_times = np.concatenate([buffered_times, times[order]])
+        buffered_ues = np.concatenate([buffered_ues, ue_ids[order]])
+        while len(buffered_times) >= chunk_size:
+            yield buffered_times[:chunk_size], buffered_ues[:chunk_size]
+            buffered_times = buffered_times[chunk_size:]
+            buffered_ues = buffered_ues[chunk_size:]
+        start = end
+
+    if len(buffered_times):
+        yield buffered_times, buffered_ues
@@ -1,12 +1,65 @@
+import hashlib
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-from sklearn.cluster import KMeans
+from scipy.spatial import cKDTree
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+from backend.latency_calculator import LatencyCalculator
+from backend.metrics_engine import MetricsEngine
+from backend.reliability_analyzer import ReliabilityAnalyzer
 
 
 class UPFOptimizer:
     """Optimizes the placement of UPFs in the network"""
 
-    def __init__(self):
+    # Placement strategies by name, see optimize()
+    STRATEGIES = {
+        "kmeans": "optimize_placement",
+        "incremental": "reoptimize",
+        "streaming": "optimize_placement_streaming",
+        "kmedian": "optimize_placement_kmedian",
+        "minmax": "optimize_placement_minmax",
+        "capacitated": "optimize_placement_capacitated",
+        "sites": "select_candidate_sites",
+    }
+    # Strategies that pick the number of UPFs themselves, ignoring num_upfs
+    COUNT_CHOOSING = ("minmax",)
+    # Strategies that may change network.num_upfs (and the length of
+    # upf_positions); whoever keeps the topology must adopt the new count
+    RESIZING = ("minmax", "sites")
+    # Iterative strategies taking a progress(fraction, message) option, called
+    # between iterations (e.g. Job.report, which stops a cancelled job there)
+    REPORTING = ("kmedian", "capacitated", "sites")
+
+    def __init__(self, metrics_engine=None):
         self.kmeans = None
+        self.minibatch_kmeans = None
+        self.kmedian_history = []
+        self.minmax_result = None
+        # Per-UPF prices of the last capacitated assignment, reused as warm start
+        self.capacity_prices = None
+        # Whether the last capacitated assignment respects every capacity
+        self.capacity_result = None
+        # Indices into the candidate list of the last discrete site selection
+        self.selected_sites = None
+        # Used to score placements with the real latency/reliability metrics
+        self.metrics_engine = metrics_engine or MetricsEngine(
+            LatencyCalculator(), ReliabilityAnalyzer()
+        )
+        # Sweep result tables keyed by network fingerprint and k range
+        self.sweep_cache = {}
+        # Last K-means solution, kept to re-optimize incrementally
+        self.warm_state = None
+
+    def optimize(self, network, strategy="kmeans", **options):
+        """Run the named placement strategy, leaving the network associated
+
+        Strategies in RESIZING may leave network.num_upfs changed.
+        """
+        return getattr(self, self.STRATEGIES[strategy])(network, **options)
 
     def optimize_placement(self, network):
         """Optimize UPF placement using K-means clustering of gNB positions"""
@@ -15,22 +68,748 @@ class UPFOptimizer:
 
         # Set UPF positions to cluster centers
         network.upf_positions = self.kmeans.cluster_centers_
+        self.warm_state = _IncrementalKMeans(
+            network.gnb_positions, self.kmeans.labels_, self.kmeans.cluster_centers_
+        )
 
         # Update network associations
         return network.update_associations()
 
-    def find_optimal_num_upfs(self, network, min_upfs=2, max_upfs=10):
-        """Find the optimal number of UPFs to minimize inertia/latency"""
-        results = []
+    def reoptimize(self, network, max_iter=100):
+        """Re-optimize the last K-means placement after topology changes
+
+        Starts from the previous solution and only revisits the clusters of
+        moved gNBs and their neighbours, stopping once centers settle. UPFs are
+        put back on the solution's centers even if no gNB moved. Falls back to
+        optimize_placement when there is no compatible solution. While the UE
+        associations are current only the gNBs of moved centers are
+        re-associated, the UEs on them are left in network.affected_ues.
+        """
+        state = self.warm_state
+        if (
+            state is None
+            or len(state.points) != network.num_gnbs
+            or len(state.centers) != network.num_upfs
+        ):
+            return self.optimize_placement(network)
+
+        changed = np.flatnonzero(np.any(state.points != network.gnb_positions, axis=1))
+        if len(changed) > 0:
+            state.update_points(changed, network.gnb_positions[changed], max_iter)
+        elif (
+            np.array_equal(network.upf_positions, state.centers)
+            and network.associations_current
+        ):
+            return network.ue_gnb_dist, network.gnb_upf_dist
+
+        # UPFs moved by hand since the last fit go back to the centers
+        moved = np.flatnonzero(np.any(network.upf_positions != state.centers, axis=1))
+        if not network.associations_current or network.constrained_assignment:
+            network.upf_positions = state.centers.copy()
+            return network.update_upf_associations()
+
+        network.upf_positions = network.upf_positions.copy()
+        affected_ues = [np.empty(0, dtype=int)]
+        for upf_id in moved:
+            network.upf_positions[upf_id] = state.centers[upf_id]
+            network.mark_upfs_modified()
+            affected_ues.append(network.reassociate_upf(upf_id)[1])
+        network.affected_ues = np.unique(np.concatenate(affected_ues))
+        return network.ue_gnb_dist, network.gnb_upf_dist
+
+    def optimize_placement_streaming(
+        self, network, chunk_size=4096, max_passes=10, tol=1e-4
+    ):
+        """Optimize UPF placement with mini-batch K-means weighted by attached UEs
+
+        gNB positions are consumed in chunks of chunk_size, so memory use does
+        not grow with the network size.
+        """
+        ues_per_gnb = np.bincount(network.ue_to_gnb, minlength=network.num_gnbs)
+        if not ues_per_gnb.any():
+            ues_per_gnb = np.ones(network.num_gnbs, dtype=int)
+
+        def gnb_chunks():
+            for start in range(0, network.num_gnbs, chunk_size):
+                stop = start + chunk_size
+                yield network.gnb_positions[start:stop], ues_per_gnb[start:stop]
+
+        network.upf_positions = self.fit_streaming(
+            gnb_chunks, network.num_upfs, chunk_size, max_passes, tol
+        )
+        return network.update_associations()
+
+    def fit_streaming(
+        self, chunk_source, num_upfs, chunk_size=4096, max_passes=10, tol=1e-4
+    ):
+        """Fit UPF centers from a re-iterable stream of (positions, weights) chunks
+
+        chunk_source is called once per pass and must return an iterable of
+        chunks, e.g. reading a gNB inventory from disk. Passes stop early when
+        no center moves by more than tol (in km).
+        """
+        self.minibatch_kmeans = MiniBatchKMeans(
+            n_clusters=num_upfs, batch_size=chunk_size, n_init=3, random_state=42
+        )
+        previous_centers = None
+        pending = []  # Buffer chunks until there are enough points to initialize
+
+        for _ in range(max_passes):
+            for positions, weights in chunk_source():
+                loaded = weights > 0
+                if not loaded.any():
+                    continue
+                positions, weights = positions[loaded], weights[loaded]
+
+                if not hasattr(self.minibatch_kmeans, "cluster_centers_"):
+                    pending.append((positions, weights))
+                    if sum(len(chunk) for chunk, _ in pending) < num_upfs:
+                        continue
+                    positions = np.concatenate([chunk for chunk, _ in pending])
+                    weights = np.concatenate([chunk for _, chunk in pending])
+                    pending = []
+
+                self.minibatch_kmeans.partial_fit(positions, sample_weight=weights)
+
+            centers = self.minibatch_kmeans.cluster_centers_.copy()
+            if (
+                previous_centers is not None
+                and np.max(np.linalg.norm(centers - previous_centers, axis=1)) <= tol
+            ):
+                break
+            previous_centers = centers
+
+        return self.minibatch_kmeans.cluster_centers_.copy()
+
+    def optimize_placement_kmedian(
+        self,
+        network,
+        objective="mean",
+        tail_power=8,
+        max_iter=100,
+        tol=1e-6,
+        progress=None,
+    ):
+        """Optimize UPF placement for UE latency with weighted k-median updates
+
+        Fronthaul latency is linear in distance, so objective="mean" minimizes
+        the UE-weighted sum of gNB-UPF distances with Weiszfeld steps.
+        objective="tail" minimizes the L_p norm (p=tail_power) of the per-gNB
+        worst UE latency instead, approaching the min-max placement as p grows.
+        Each iteration is linear in the number of gNBs. progress(fraction,
+        message) is called after every iteration.
+        """
+        context = self.metrics_engine.placement_context(network)
+        gnb_positions = context["gnb_positions"]
+        weights = context["ues_per_gnb"].astype(float)
+        loaded = weights > 0
+        gnb_positions, weights = gnb_positions[loaded], weights[loaded]
+        base_latency = context["max_base_latency"][loaded]
+        power = tail_power if objective == "tail" else 1
+        ms_per_km = 1000 / self.metrics_engine.latency_calculator.speed_fiber
+
+        # Start from load-weighted K-means centers
+        centers = (
+            KMeans(n_clusters=network.num_upfs, n_init=3, random_state=42)
+            .fit(gnb_positions, sample_weight=weights)
+            .cluster_centers_
+        )
+        self.kmedian_history = []
+        best_cost, best_centers = np.inf, centers
+
+        for iteration in range(max_iter):
+            dist = np.linalg.norm(gnb_positions[:, None] - centers, axis=2)
+            labels = np.argmin(dist, axis=1)
+            dist = np.maximum(dist[np.arange(len(labels)), labels], 1e-9)
+
+            latency = base_latency + dist * ms_per_km
+            cost = np.sum(weights * latency**power)
+            self.kmedian_history.append(cost)
+            # Reweighted steps are not monotone for p > 1, keep the best iterate
+            if cost < best_cost:
+                best_cost, best_centers = cost, centers
+
+            # Iteratively reweighted Weiszfeld step for sum(w * latency^p)
+            step_weights = weights * (latency / latency.max()) ** (power - 1) / dist
+            new_centers = _weighted_centers(
+                gnb_positions, step_weights, labels, centers
+            )
+
+            shift = np.max(np.linalg.norm(new_centers - centers, axis=1))
+            centers = new_centers
+            if shift <= tol:
+                break
+            if progress is not None:
+                progress((iteration + 1) / max_iter, f"iteration {iteration + 1}")
+
+        network.upf_positions = best_centers
+        return network.update_associations()
+
+    def optimize_placement_minmax(self, network, latency_target=1.0):
+        """Place the fewest UPFs that keep every UE latency below latency_target (ms)
+
+        Each gNB gets a coverage radius from the latency budget left by its worst
+        UE. A KD-tree greedy cover over gNB sites gives an upper bound on the
+        number of UPFs, then a farthest-first traversal on radius-normalized
+        distances looks for a smaller feasible count. Sets network.num_upfs to
+        that count (see RESIZING).
+        """
+        context = self.metrics_engine.placement_context(network)
+        loaded = context["ues_per_gnb"] > 0
+        gnb_positions = context["gnb_positions"][loaded]
+        ms_per_km = 1000 / self.metrics_engine.latency_calculator.speed_fiber
+
+        # Largest fronthaul distance (km) each gNB can afford, kept strictly inside
+        # the budget; gNBs already over budget get a co-located UPF
+        slack = latency_target - context["max_base_latency"][loaded]
+        radius = np.maximum(slack / ms_per_km * (1 - 1e-9), 0.0)
+        feasible = bool(np.all(slack > 0))
+
+        centers = _greedy_cover(gnb_positions, radius)
+        traversal = _farthest_first_cover(gnb_positions, radius, len(centers) - 1)
+        if traversal is not None:
+            centers = traversal
+
+        network.upf_positions = gnb_positions[centers].copy()
+        network.num_upfs = len(centers)
+        ue_gnb_dist, gnb_upf_dist = network.update_associations()
+
+        self.minmax_result = {
+            "num_upfs": network.num_upfs,
+            "latency_target": latency_target,
+            "feasible": feasible,
+        }
+        return ue_gnb_dist, gnb_upf_dist
+
+    def assign_capacitated(self, network, capacities, loads=None, max_rounds=100):
+        """Assign gNBs to UPFs without exceeding per-UPF capacities
+
+        loads defaults to the number of UEs per gNB (a packet load works too) and
+        capacities is a scalar or one limit per UPF in the same unit. gNBs bid
+        for the UPF minimizing distance + price; overloaded UPFs raise their
+        price just enough to shed their cheapest-to-move gNBs (auction style).
+        Prices are kept between calls, so re-solving after a small change
+        usually takes a few rounds. Returns the per-UPF load.
+
+        If the loads cannot be fitted (e.g. they exceed the total capacity) the
+        least overloaded assignment found is kept and capacity_result has
+        feasible=False, with the largest excess load over a capacity.
+        """
+        if loads is None:
+            loads = np.bincount(network.ue_to_gnb, minlength=network.num_gnbs)
+        loads = np.asarray(loads, dtype=float)
+        capacities = np.broadcast_to(
+            np.asarray(capacities, dtype=float), network.num_upfs
+        )
+        dist = np.linalg.norm(
+            network.gnb_positions[:, None] - network.upf_positions, axis=2
+        )
+
+        prices = self.capacity_prices
+        if prices is None or len(prices) != network.num_upfs:
+            prices = np.zeros(network.num_upfs)
+        prices = prices - prices.min()
+        increment = 1e-6 * network.scale_factor
+
+        for _ in range(max_rounds):
+            cost = dist + prices
+            labels = np.argmin(cost, axis=1)
+            upf_load = np.bincount(labels, loads, minlength=network.num_upfs)
+            overloaded = np.flatnonzero(upf_load > capacities)
+            if len(overloaded) == 0:
+                break
+
+            for upf_id in overloaded:
+                members = np.flatnonzero(labels == upf_id)
+                # Extra cost of each member's best alternative UPF
+                alternatives = cost[members].copy()
+                alternatives[:, upf_id] = np.inf
+                regret = alternatives.min(axis=1) - cost[members, upf_id]
+                order = np.argsort(regret)
+                # Shed the lowest-regret members until the rest fits
+                kept_load = upf_load[upf_id] - np.cumsum(loads[members[order]])
+                shed = np.searchsorted(-kept_load, -capacities[upf_id])
+                prices[upf_id] += regret[order[min(shed, len(order) - 1)]] + increment
+
+        labels = _repair_capacities(dist, labels, loads, capacities)
+        upf_load = np.bincount(labels, loads, minlength=network.num_upfs)
+        overload = float(np.max(upf_load - capacities))
+        self.capacity_prices = prices
+        self.capacity_result = {
+            "feasible": overload <= 0,
+            "overload": max(overload, 0.0),
+        }
+        network.assign_gnbs(labels)
+        return upf_load
 
-        for num_upfs in range(min_upfs, max_upfs + 1):
-            kmeans = KMeans(n_clusters=num_upfs, n_init=10, random_state=42)
-            kmeans.fit(network.gnb_positions)
-            results.append(
-                {
-                    "num_upfs": num_upfs,
-                    "inertia": kmeans.inertia_,  # Sum of squared distances to closest cluster center
-                }
+    def optimize_placement_capacitated(
+        self, network, capacities, loads=None, max_iter=30, tol=1e-4, progress=None
+    ):
+        """Optimize UPF placement and capacitated assignment together
+
+        Alternates assign_capacitated with a load-weighted Weiszfeld step that
+        moves every UPF towards the gNBs it serves, so the fronthaul distance
+        is reduced without breaking the capacity limits. Check
+        capacity_result["feasible"] afterwards, see assign_capacitated.
+        The UE associations are computed once, each iteration only refreshes
+        the gNB-to-UPF distances. progress(fraction, message) is called after
+        every iteration.
+        """
+        network.update_upf_associations()
+        if loads is None:
+            loads = np.bincount(network.ue_to_gnb, minlength=network.num_gnbs)
+        loads = np.asarray(loads, dtype=float)
+        gnb_positions = np.asarray(network.gnb_positions, dtype=float)
+
+        for iteration in range(max_iter):
+            network.update_upf_associations()
+            self.assign_capacitated(network, capacities, loads)
+            labels = network.gnb_to_upf
+            dist = np.maximum(
+                np.linalg.norm(gnb_positions - network.upf_positions[labels], axis=1),
+                1e-9,
+            )
+            centers = _weighted_centers(
+                gnb_positions, loads / dist, labels, network.upf_positions
+            )
+            shift = np.max(np.linalg.norm(centers - network.upf_positions, axis=1))
+            network.upf_positions = centers
+            if shift <= tol:
+                break
+            if progress is not None:
+                progress((iteration + 1) / max_iter, f"iteration {iteration + 1}")
+
+        network.update_upf_associations()
+        self.assign_capacitated(network, capacities, loads)
+        return network.ue_gnb_dist, network.gnb_upf_dist
+
+    def select_candidate_sites(
+        self,
+        network,
+        candidate_sites,
+        num_upfs=None,
+        local_search=True,
+        block_size=512,
+        max_swap_passes=5,
+        progress=None,
+    ):
+        """Place UPFs on num_upfs of the given candidate sites (e.g. data centers)
+
+        Sites are picked by lazy-greedy on the UE-weighted fronthaul distance
+        (the UPF-dependent part of the aggregate UE latency), keeping marginal
+        gains in a priority queue. An optional swap local search then replaces
+        chosen sites while that lowers the cost. gNB x site distances are
+        precomputed block by block as float32. num_upfs defaults to
+        network.num_upfs, which is set to the number of sites chosen (see
+        RESIZING). progress(fraction, message) is called after the greedy pick
+        and after every swap pass.
+        """
+        candidate_sites = np.asarray(candidate_sites, dtype=float)
+        num_upfs = num_upfs or network.num_upfs
+        weights = np.bincount(network.ue_to_gnb, minlength=network.num_gnbs)
+        loaded = weights > 0
+        gnb_positions = np.asarray(network.gnb_positions, dtype=float)[loaded]
+        weights = weights[loaded].astype(np.float32)
+
+        dist = np.empty((len(gnb_positions), len(candidate_sites)), dtype=np.float32)
+        for start in range(0, len(candidate_sites), block_size):
+            block = candidate_sites[start : start + block_size]
+            dist[:, start : start + len(block)] = np.linalg.norm(
+                gnb_positions[:, None] - block, axis=2
+            )
+
+        chosen = _lazy_greedy_sites(dist, weights, num_upfs, block_size)
+        if local_search:
+            if progress is not None:
+                progress(1 / (max_swap_passes + 1), "greedy sites chosen")
+            chosen = _swap_sites(
+                dist, weights, chosen, block_size, max_swap_passes, progress
             )
 
+        self.selected_sites = chosen
+        network.upf_positions = candidate_sites[chosen].copy()
+        network.num_upfs = len(chosen)
+        return network.update_associations()
+
+    def find_optimal_num_upfs(self, network, min_upfs=2, max_upfs=10, n_jobs=None):
+        """Find the optimal number of UPFs to minimize inertia/latency
+
+        Each k in [min_upfs, max_upfs] is clustered and scored with the end-to-end
+        latency and reliability metrics. Contiguous blocks of k values are
+        fanned out to a process pool (n_jobs workers, all cores by default) and
+        every k inside a block is warm-started from the previous k's centers.
+        Results are cached until the gNB/UE layout changes.
+        """
+        context = self.metrics_engine.placement_context(network)
+        key = (_context_fingerprint(context), min_upfs, max_upfs)
+        if key in self.sweep_cache:
+            return self.sweep_cache[key]
+
+        num_upfs_range = np.arange(min_upfs, max_upfs + 1)
+        n_jobs = min(n_jobs or os.cpu_count() or 1, len(num_upfs_range))
+        blocks = [block.tolist() for block in np.array_split(num_upfs_range, n_jobs)]
+
+        if n_jobs == 1:
+            block_results = [_sweep_block(self.metrics_engine, context, blocks[0])]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                block_results = list(
+                    executor.map(
+                        _sweep_block,
+                        [self.metrics_engine] * n_jobs,
+                        [context] * n_jobs,
+                        blocks,
+                    )
+                )
+
+        results = [row for block in block_results for row in block]
+        self.sweep_cache[key] = results
         return results
+
+
+class _IncrementalKMeans:
+    """K-means solution that can be refined locally when a few points move"""
+
+    def __init__(self, points, labels, centers, tol=1e-4):
+        self.points = np.array(points, dtype=float)
+        self.labels = np.array(labels, dtype=int)
+        self.centers = np.array(centers, dtype=float)
+        # Same convergence rule as sklearn: total squared center shift
+        # relative to the data variance
+        self.tolerance = tol * np.mean(np.var(self.points, axis=0))
+        num_centers = len(self.centers)
+        self.counts = np.bincount(self.labels, minlength=num_centers)
+        self.sums = np.stack(
+            [
+                np.bincount(self.labels, self.points[:, axis], minlength=num_centers)
+                for axis in range(2)
+            ],
+            axis=1,
+        )
+        # Point ids of every cluster as arrays appended to on _add; ids of
+        # points that left are dropped lazily in _members_of
+        order = np.argsort(self.labels, kind="stable")
+        self.members = [[ids] for ids in np.split(order, np.cumsum(self.counts)[:-1])]
+        # Upper bound on the distance of each cluster's members to its center
+        self.radius = np.zeros(num_centers)
+        np.maximum.at(self.radius, self.labels, self._own_dist(np.arange(len(points))))
+        # Clusters whose members changed after their center was last updated
+        self.stale = np.empty(0, dtype=int)
+
+    def update_points(self, point_ids, positions, max_iter=100):
+        """Move points and run Lloyd steps restricted to the affected clusters
+
+        Like sklearn, every center update is followed by an assignment step,
+        so on return each label is the nearest center.
+        """
+        sources = self._remove(point_ids)
+        self.points[point_ids] = positions
+        targets = self._nearest(point_ids)
+        self._add(point_ids, targets)
+        dirty = np.union1d(np.union1d(sources, targets), self.stale)
+        self.stale = np.empty(0, dtype=int)
+
+        for _ in range(max_iter):
+            occupied = dirty[self.counts[dirty] > 0]
+            new_centers = self.sums[occupied] / self.counts[occupied, None]
+            shift = np.linalg.norm(new_centers - self.centers[occupied], axis=1)
+            self.centers[occupied] = new_centers
+            self.radius[occupied] += shift
+            moved = occupied[shift > 0]
+            if len(moved) == 0:
+                break
+
+            # A point of cluster c can only switch to center m if it is farther
+            # than |c - m| / 2 from c: unmoved clusters only need checking
+            # against moved centers, moved clusters against every other center
+            # Only clusters whose radius bound reaches that far are visited, so
+            # the work is O(k * moved + members of the clusters visited)
+            gap_to_moved = np.linalg.norm(
+                self.centers[:, None] - self.centers[moved], axis=2
+            )
+            gap_to_moved[moved, np.arange(len(moved))] = np.inf
+            half_gap = gap_to_moved.min(axis=1) / 2
+            gap_of_moved = np.linalg.norm(
+                self.centers[moved][:, None] - self.centers, axis=2
+            )
+            gap_of_moved[np.arange(len(moved)), moved] = np.inf
+            half_gap[moved] = gap_of_moved.min(axis=1) / 2
+
+            clusters = np.flatnonzero(self.radius >= half_gap)
+            point_ids = self._members_of(clusters)
+            own_dist = self._own_dist(point_ids)
+            # The visited clusters' bounds are tightened to their exact radius
+            self.radius[clusters] = 0.0
+            np.maximum.at(self.radius, self.labels[point_ids], own_dist)
+            point_ids = point_ids[own_dist >= half_gap[self.labels[point_ids]]]
+
+            # Points of moved clusters may switch anywhere, the others only to
+            # a moved center
+            nearest = self.labels[point_ids]
+            anywhere = np.isin(nearest, moved)
+            nearest[anywhere] = self._nearest(point_ids[anywhere])
+            nearest[~anywhere] = self._nearest_moved(point_ids[~anywhere], moved)
+            switched = nearest != self.labels[point_ids]
+            point_ids, nearest = point_ids[switched], nearest[switched]
+            if len(point_ids) == 0:
+                break
+            sources = self._remove(point_ids)
+            self._add(point_ids, nearest)
+            dirty = np.union1d(sources, nearest)
+            if np.sum(shift**2) <= self.tolerance:
+                # Converged, the final assignment's centers are updated next call
+                self.stale = dirty
+                break
+        else:
+            self.stale = dirty
+
+    def _members_of(self, clusters):
+        """Point ids of the given clusters, in O(their size + additions)"""
+        parts = []
+        for cluster in clusters.tolist():
+            chunks = self.members[cluster]
+            ids = chunks[0] if len(chunks) == 1 else np.unique(np.concatenate(chunks))
+            ids = ids[self.labels[ids] == cluster]
+            self.members[cluster] = [ids]
+            parts.append(ids)
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
+
+    def _own_dist(self, point_ids):
+        return np.linalg.norm(
+            self.points[point_ids] - self.centers[self.labels[point_ids]], axis=1
+        )
+
+    def _nearest(self, point_ids):
+        dist = np.linalg.norm(self.points[point_ids][:, None] - self.centers, axis=2)
+        return np.argmin(dist, axis=1)
+
+    def _nearest_moved(self, point_ids, moved):
+        """Nearest of each point's own center and the moved centers"""
+        labels = self.labels[point_ids]
+        dist = np.linalg.norm(
+            self.points[point_ids][:, None] - self.centers[moved], axis=2
+        )
+        closest = np.argmin(dist, axis=1)
+        closer = dist[np.arange(len(point_ids)), closest] < self._own_dist(point_ids)
+        return np.where(closer, moved[closest], labels)
+
+    def _remove(self, point_ids):
+        """Take points out of their clusters and return the clusters they left"""
+        labels = self.labels[point_ids]
+        np.subtract.at(self.counts, labels, 1)
+        np.subtract.at(self.sums, labels, self.points[point_ids])
+        return labels
+
+    def _add(self, point_ids, labels):
+        """Put points into the given clusters"""
+        self.labels[point_ids] = labels
+        np.add.at(self.counts, labels, 1)
+        np.add.at(self.sums, labels, self.points[point_ids])
+        for cluster in np.unique(labels).tolist():
+            self.members[cluster].append(point_ids[labels == cluster])
+        np.maximum.at(self.radius, labels, self._own_dist(point_ids))
+
+
+def _sweep_block(metrics_engine, context, num_upfs_values, random_state=42):
+    """Cluster and score consecutive k values, warm-starting each from the last"""
+    gnb_positions = context["gnb_positions"]
+    results = []
+    centers = None
+
+    for num_upfs in num_upfs_values:
+        if centers is None:
+            kmeans = KMeans(n_clusters=num_upfs, n_init=10, random_state=random_state)
+        else:
+            kmeans = KMeans(
+                n_clusters=num_upfs,
+                init=_grow_centers(gnb_positions, centers, num_upfs),
+                n_init=1,
+                random_state=random_state,
+            )
+        kmeans.fit(gnb_positions)
+        centers = kmeans.cluster_centers_
+
+        scores = metrics_engine.score_placements(context, centers)
+        results.append(
+            {
+                "num_upfs": num_upfs,
+                "inertia": kmeans.inertia_,  # Sum of squared distances to closest cluster center
+                **{name: values[0].item() for name, values in scores.items()},
+                "upf_positions": centers.tolist(),
+            }
+        )
+
+    return results
+
+
+def _weighted_centers(points, weights, labels, centers):
+    """Weighted mean of the points of each cluster, empty clusters keep their center"""
+    totals = np.bincount(labels, weights, minlength=len(centers))
+    new_centers = np.array(centers, dtype=float)
+    occupied = totals > 0
+    for axis in range(2):
+        new_centers[occupied, axis] = (
+            np.bincount(labels, weights * points[:, axis], minlength=len(centers))[
+                occupied
+            ]
+            / totals[occupied]
+        )
+    return new_centers
+
+
+def _repair_capacities(dist, labels, loads, capacities):
+    """Move gNBs off overloaded UPFs to the closest UPF with spare capacity"""
+    labels = labels.copy()
+    upf_load = np.bincount(labels, loads, minlength=len(capacities))
+
+    for upf_id in np.flatnonzero(upf_load > capacities):
+        members = np.flatnonzero(labels == upf_id)
+        # Members closest to another UPF move first
+        others = dist[members].copy()
+        others[:, upf_id] = np.inf
+        for gnb_id in members[np.argsort(others.min(axis=1) - dist[members, upf_id])]:
+            if upf_load[upf_id] <= capacities[upf_id]:
+                break
+            spare = upf_load + loads[gnb_id] <= capacities
+            spare[upf_id] = False
+            if not spare.any():
+                continue
+            target = np.flatnonzero(spare)[np.argmin(dist[gnb_id, spare])]
+            labels[gnb_id] = target
+            upf_load[upf_id] -= loads[gnb_id]
+            upf_load[target] += loads[gnb_id]
+
+    return labels
+
+
+def _lazy_greedy_sites(dist, weights, num_sites, block_size):
+    """Greedy weighted k-median over site columns with lazily updated gains"""
+    # A virtual site farther than every real one stands in for "unserved"
+    current = np.full(len(dist), dist.max() + 1, dtype=np.float32)
+
+    def gain(site):
+        return float(weights @ np.maximum(current - dist[:, site], 0))
+
+    heap = []
+    for start in range(0, dist.shape[1], block_size):
+        block = dist[:, start : start + block_size]
+        gains = weights @ np.maximum(current[:, None] - block, 0)
+        heap.extend((-float(value), start + i) for i, value in enumerate(gains))
+    heapq.heapify(heap)
+
+    chosen = []
+    while heap and len(chosen) < num_sites:
+        _, site = heapq.heappop(heap)
+        # Gains only shrink as sites are added, so a refreshed gain that still
+        # beats the best stale one is the true maximum
+        refreshed = gain(site)
+        if heap and refreshed < -heap[0][0]:
+            heapq.heappush(heap, (-refreshed, site))
+            continue
+        chosen.append(site)
+        np.minimum(current, dist[:, site], out=current)
+
+    return np.array(chosen, dtype=int)
+
+
+def _swap_sites(dist, weights, chosen, block_size, max_passes, progress=None):
+    """Swap chosen sites for unchosen ones while the weighted distance drops"""
+    chosen = chosen.copy()
+
+    for swap_pass in range(max_passes):
+        improved = False
+        for slot in range(len(chosen)):
+            chosen_dist = dist[:, chosen]
+            cost = float(weights @ chosen_dist.min(axis=1))
+            # Service distance of every gNB if this slot's site were removed
+            others = np.delete(chosen_dist, slot, axis=1)
+            without = np.min(others, axis=1, initial=np.inf)
+
+            best_cost, best_site = cost, None
+            for start in range(0, dist.shape[1], block_size):
+                block = dist[:, start : start + block_size]
+                costs = weights @ np.minimum(without[:, None], block)
+                site = int(np.argmin(costs))
+                if costs[site] < best_cost * (1 - 1e-7):
+                    best_cost, best_site = float(costs[site]), start + site
+
+            if best_site is not None and best_site not in chosen:
+                chosen[slot] = best_site
+                improved = True
+        if not improved:
+            break
+        if progress is not None:
+            progress((swap_pass + 2) / (max_passes + 1), f"swap pass {swap_pass + 1}")
+
+    return chosen
+
+
+def _greedy_cover(points, radius):
+    """Indices of points used as centers so each point i has one within radius[i]
+
+    The most constrained uncovered point is opened first and every point it
+    covers is removed through a KD-tree ball query.
+    """
+    tree = cKDTree(points)
+    covered = np.zeros(len(points), dtype=bool)
+    centers = []
+
+    for point_id in np.argsort(radius, kind="stable"):
+        if covered[point_id]:
+            continue
+        centers.append(point_id)
+        nearby = np.asarray(
+            tree.query_ball_point(points[point_id], radius.max()), dtype=int
+        )
+        within = (
+            np.linalg.norm(points[nearby] - points[point_id], axis=1) <= radius[nearby]
+        )
+        covered[nearby[within]] = True
+
+    return np.array(centers, dtype=int)
+
+
+def _farthest_first_cover(points, radius, max_centers):
+    """Smallest farthest-first prefix covering every point within its radius
+
+    Distances are normalized by each point's radius so a value <= 1 means
+    covered. Returns None if no prefix of at most max_centers works.
+    """
+    if max_centers < 1:
+        return None
+
+    def normalized(dist):
+        # Zero-radius points are only covered by a co-located center
+        return np.divide(
+            dist, radius, out=np.where(dist > 0, np.inf, 0.0), where=radius > 0
+        )
+
+    centers = [int(np.argmin(radius))]
+    nearest = normalized(np.linalg.norm(points - points[centers[0]], axis=1))
+    while nearest.max() > 1:
+        if len(centers) == max_centers:
+            return None
+        centers.append(int(np.argmax(nearest)))
+        nearest = np.minimum(
+            nearest, normalized(np.linalg.norm(points - points[centers[-1]], axis=1))
+        )
+    return np.array(centers, dtype=int)
+
+
+def _grow_centers(points, centers, num_centers):
+    """Extend centers to num_centers by repeatedly adding the farthest point"""
+    centers = np.array(centers, dtype=float)
+    nearest = np.min(np.linalg.norm(points[:, None] - centers, axis=2), axis=1)
+    while len(centers) < num_centers:
+        farthest = points[np.argmax(nearest)]
+        centers = np.vstack([centers, farthest])
+        nearest = np.minimum(nearest, np.linalg.norm(points - farthest, axis=1))
+    return centers
+
+
+def _context_fingerprint(context):
+    """Hash of the arrays a placement score depends on"""
+    digest = hashlib.blake2b(digest_size=16)
+    for name in ("gnb_positions", "ues_per_gnb", "sum_base_latency"):
+        digest.update(np.ascontiguousarray(context[name]).tobytes())
+    return digest.hexdigest()
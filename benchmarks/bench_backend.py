@@ -0,0 +1,213 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+# Add the repository root to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from backend.network_topology import NetworkTopology
+from backend.latency_calculator import LatencyCalculator
+from backend.reliability_analyzer import ReliabilityAnalyzer
+from backend.upf_optimizer import UPFOptimizer
+from backend.packet_generator import PacketGenerator
+from frontend.visualizer import NetworkVisualizer
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Topology shape per tier: one gNB per UES_PER_GNB UEs (at least two per UPF)
+# and a fixed UPF count
+UES_PER_GNB = 100
+NUM_UPFS = 8
+# Above this many UEs the dense distance matrices no longer fit, use KD-trees
+DENSE_MAX_UES = 10**4
+
+
+def _benchmarks():
+    """(name, largest UE count it is run at, setup(topology) -> callable)"""
+    latency_calculator = LatencyCalculator()
+    reliability_analyzer = ReliabilityAnalyzer()
+
+    def latencies(topology):
+        return latency_calculator.calculate_latencies(
+            topology, topology.ue_gnb_dist, topology.gnb_upf_dist
+        )
+
+    def create_figure(topology):
+        packets = PacketGenerator(rng=0).generate_packets(topology)
+        ue_latencies = latencies(topology)
+        visualizer = NetworkVisualizer()
+        return lambda: visualizer.create_figure(topology, packets, ue_latencies)
+
+    return [
+        ("update_associations", 10**7, lambda t: t.update_associations),
+        ("calculate_latencies", 10**7, lambda t: lambda: latencies(t)),
+        (
+            "calculate_reliability",
+            10**7,
+            lambda t: lambda: reliability_analyzer.calculate_reliability(
+                t, t.ue_gnb_dist, t.gnb_upf_dist
+            ),
+        ),
+        (
+            "generate_packets",
+            10**7,
+            lambda t: lambda: PacketGenerator(rng=0).generate_packets(t),
+        ),
+        (
+            "optimize_placement",
+            10**7,
+            lambda t: lambda: UPFOptimizer().optimize_placement(t),
+        ),
+        (
+            "find_optimal_num_upfs",
+            10**6,
+            lambda t: lambda: UPFOptimizer().find_optimal_num_upfs(t, n_jobs=1),
+        ),
+        # One trace per link, beyond this the figure is not usable anyway
+        ("create_figure", 10**4, create_figure),
+    ]
+
+
+def _measure(func, repeat):
+    """Best wall time of repeat calls, then the tracemalloc peak of one more"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+        if times[-1] > 2.0:  # slow enough that one run is representative
+            break
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak / 2**20
+
+
+def run_benchmarks(tiers, names=None, repeat=3):
+    """Time every selected benchmark at 10**tier UEs for each tier"""
+    results = []
+    for tier in tiers:
+        num_ues = 10**tier
+        topology = NetworkTopology(
+            num_ues,
+            max(2 * NUM_UPFS, num_ues // UES_PER_GNB),
+            NUM_UPFS,
+            association_mode="dense" if num_ues <= DENSE_MAX_UES else "kdtree",
+            seed=0,
+        )
+        upf_positions = topology.upf_positions.copy()
+
+        for name, max_ues, setup in _benchmarks():
+            if names and name not in names:
+                continue
+            if num_ues > max_ues:
+                continue
+            # Optimizers move the UPFs, start every benchmark from the same layout
+            topology.upf_positions = upf_positions.copy()
+            topology.update_associations()
+
+            seconds, peak_mb = _measure(setup(topology), repeat)
+            results.append(
+                {
+                    "benchmark": name,
+                    "num_ues": num_ues,
+                    "seconds": seconds,
+                    "peak_mb": peak_mb,
+                }
+            )
+            print(
+                f"{name:<24}{num_ues:>10}  {seconds:10.4f} s  {peak_mb:10.1f} MB",
+                flush=True,
+            )
+    return results
+
+
+def compare(results, baseline, tolerance=0.25, min_seconds=0.01):
+    """Results slower than baseline by more than tolerance (and min_seconds)"""
+    reference = {(row["benchmark"], row["num_ues"]): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        base = reference.get((row["benchmark"], row["num_ues"]))
+        if base is None:
+            continue
+        ratio = row["seconds"] / base["seconds"]
+        flag = ""
+        if ratio > 1 + tolerance and row["seconds"] - base["seconds"] > min_seconds:
+            regressions.append({**row, "baseline_seconds": base["seconds"]})
+            flag = "  REGRESSION"
+        print(
+            f"{row['benchmark']:<24}{row['num_ues']:>10}  "
+            f"{base['seconds']:10.4f} -> {row['seconds']:10.4f} s  x{ratio:5.2f}{flag}"
+        )
+    return regressions
+
+
+def main():
+    """Benchmark the backend hot paths across UE-count tiers"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--tiers",
+        type=int,
+        nargs="+",
+        default=[2, 3, 4, 5],
+        help="UE counts as powers of ten, up to 7",
+    )
+    parser.add_argument("--benchmarks", nargs="+", help="only run these")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results as JSON here")
+    parser.add_argument(
+        "--baseline",
+        default=DEFAULT_BASELINE,
+        help="JSON results to compare against",
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="store the results as baseline"
+    )
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": run_benchmarks(args.tiers, args.benchmarks, args.repeat),
+    }
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline first")
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f"\nCompared with {args.baseline} ({baseline['meta']['created']}):")
+    regressions = compare(report["results"], baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
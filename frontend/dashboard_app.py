@@ -1,7 +1,17 @@
+import copy
+import time
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output, State
+from flask import g, request
 import numpy as np
+from backend.metrics_engine import MetricsEngine
+from backend.evaluation_cache import EvaluationCache
+from backend.job_manager import JobManager, DONE
+from backend.profiler import default_profiler, profiled
+
+# Bar characters of the recent-latency sparklines in the diagnostics panel
+SPARK_BARS = " ▁▂▃▄▅▆▇█"
 
 
 class Dashboard:
@@ -13,6 +23,7 @@ class Dashboard:
         upf_optimizer,
         packet_generator,
         visualizer,
+        profiler=None,
     ):
         self.network = network
         self.latency_calculator = latency_calculator
@@ -20,12 +31,25 @@ class Dashboard:
         self.upf_optimizer = upf_optimizer
         self.packet_generator = packet_generator
         self.visualizer = visualizer
+        # Stage timings shown in the diagnostics panel
+        self.profiler = default_profiler if profiler is None else profiler
+        self.metrics_engine = MetricsEngine(
+            latency_calculator,
+            reliability_analyzer,
+            EvaluationCache(),
+            profiler=self.profiler,
+        )
 
         # Initial state
         self.selected_upf = -1
         self.latencies = None
         self.reliabilities = None
         self.packet_data = None
+        self.packet_interval = 1.0  # s, matches the interval component
+
+        # Optimizations run in the background so callbacks never block on them
+        self.jobs = JobManager(max_workers=1)
+        self.optimize_job = None
 
         # Calculate initial metrics
         self.update_metrics()
@@ -34,17 +58,135 @@ class Dashboard:
         self.app = dash.Dash(__name__, suppress_callback_exceptions=True)
         self.setup_layout()
         self.setup_callbacks()
+        self.setup_profiling()
 
+    @profiled("dashboard.update_metrics")
     def update_metrics(self):
         """Update all network metrics"""
-        ue_gnb_dist, gnb_upf_dist = self.network.update_associations()
-        self.latencies = self.latency_calculator.calculate_latencies(
-            self.network, ue_gnb_dist, gnb_upf_dist
+        # Layouts seen before (e.g. toggling back) come from the evaluation cache
+        metrics = self.metrics_engine.evaluate_network(self.network)
+        self.latencies = metrics["latencies"]
+        self.reliabilities = metrics["reliabilities"]
+        # Packets in flight keep going, their paths follow the new associations
+        with self.profiler.stage("dashboard.packets"):
+            self.packet_data = self.packet_generator.advance(self.network, 0.0)
+
+    @profiled("dashboard.update_affected_metrics")
+    def update_affected_metrics(self):
+        """Update metrics only for the UEs touched by the last incremental re-association"""
+        affected_ues = self.network.affected_ues
+        if affected_ues is None:
+            return self.update_metrics()
+
+        metrics = self.metrics_engine.update_affected(
+            self.network, self.latencies, self.reliabilities
         )
-        self.reliabilities = self.reliability_analyzer.calculate_reliability(
-            self.network, ue_gnb_dist, gnb_upf_dist
+        self.latencies = metrics["latencies"]
+        self.reliabilities = metrics["reliabilities"]
+        # Packets in flight keep going, their paths follow the new associations
+        with self.profiler.stage("dashboard.packets"):
+            self.packet_data = self.packet_generator.advance(self.network, 0.0)
+
+    def optimize_in_background(self):
+        """Start a warm-started re-optimization on a copy of the network
+
+        Does nothing while an optimization is already running.
+        """
+        if self.optimize_job is not None:
+            return
+        snapshot = copy.deepcopy(self.network)
+
+        def reoptimize(job):
+            self.upf_optimizer.reoptimize(snapshot)
+            return snapshot
+
+        self.optimize_job = self.jobs.submit(reoptimize, name="optimize")
+
+    def apply_finished_optimization(self):
+        """Adopt the optimized layout once the job is done
+
+        Returns the job state and whether its layout was applied; it is not if
+        the job failed or the UEs/gNBs changed since it was started.
+        """
+        state = self.jobs.poll(self.optimize_job)
+        if state["status"] not in self.jobs.FINAL_STATES:
+            return state, False
+
+        self.jobs.remove(self.optimize_job)
+        self.optimize_job = None
+        optimized = state["result"]
+        if state["status"] != DONE or optimized.version != self.network.version:
+            return state, False
+        self.network.upf_positions = optimized.upf_positions.copy()
+        self.update_metrics()
+        return state, True
+
+    def profiler_table(self):
+        """Stage timings as an HTML table, with a sparkline of recent latencies"""
+        if not self.profiler.stages:
+            message = "No stages timed yet" if self.profiler.enabled else "Off"
+            return html.P(f"Profiling: {message}", style={"color": "gray"})
+
+        cell = {"padding": "2px 10px", "text-align": "right"}
+        header = html.Tr(
+            [
+                html.Th(column, style=cell)
+                for column in [
+                    "Stage",
+                    "Calls",
+                    "Mean (ms)",
+                    "p50",
+                    "p95",
+                    "Max",
+                    "Recent (10 us .. 10 s)",
+                ]
+            ]
         )
-        self.packet_data = self.packet_generator.generate_packets(self.network)
+        rows = [header]
+        for name, stats in self.profiler.report().items():
+            counts = self.profiler.histogram(name)
+            levels = np.ceil(counts / counts.max() * (len(SPARK_BARS) - 1))
+            rows.append(
+                html.Tr(
+                    [
+                        html.Td(name, style={**cell, "text-align": "left"}),
+                        html.Td(stats["calls"], style=cell),
+                        html.Td(f"{stats['mean']:.2f}", style=cell),
+                        html.Td(f"{stats['p50']:.2f}", style=cell),
+                        html.Td(f"{stats['p95']:.2f}", style=cell),
+                        html.Td(f"{stats['maximum']:.2f}", style=cell),
+                        html.Td(
+                            "".join(SPARK_BARS[int(level)] for level in levels),
+                            style={**cell, "font-family": "monospace"},
+                        ),
+                    ]
+                )
+            )
+        return html.Table(rows, style={"font-size": "13px", "margin-top": "5px"})
+
+    def setup_profiling(self):
+        """Time whole callback requests, including Dash's output serialization
+
+        Each is recorded as request.<first output id>, next to the stages the
+        callback itself runs.
+        """
+        server = self.app.server
+
+        @server.before_request
+        def start_request_timer():
+            if self.profiler.enabled:
+                g.profiler_started = time.perf_counter()
+
+        @server.after_request
+        def stop_request_timer(response):
+            started = g.pop("profiler_started", None)
+            if started is not None and request.path.endswith("_dash-update-component"):
+                output = (request.get_json(silent=True) or {}).get("output", "")
+                self.profiler.record(
+                    f"request.{output.lstrip('.').split('.')[0]}",
+                    time.perf_counter() - started,
+                )
+            return response
 
     def setup_layout(self):
         """Set up the Dash layout"""
@@ -143,6 +285,11 @@ class Dashboard:
                             ],
                             style={"text-align": "center", "margin": "10px 0"},
                         ),
+                        # Background job progress
+                        html.Div(
+                            id="job-status",
+                            style={"text-align": "center", "min-height": "20px"},
+                        ),
                     ]
                 ),
                 # Graph section
@@ -167,15 +314,37 @@ class Dashboard:
                     ],
                     style={"margin": "10px 0"},
                 ),
+                # Stage timings, refreshed while profiling is enabled
+                html.Details(
+                    [
+                        html.Summary("Diagnostics"),
+                        dcc.Checklist(
+                            id="profiler-toggle",
+                            options=[{"label": " Profile stages", "value": "on"}],
+                            value=["on"] if self.profiler.enabled else [],
+                        ),
+                        html.Div(id="profiler-stats"),
+                    ],
+                    style={
+                        "margin": "10px 0",
+                        "padding": "10px",
+                        "background-color": "#f5f5f5",
+                        "border-radius": "5px",
+                    },
+                ),
+                dcc.Interval(id="profiler-interval", interval=2000, n_intervals=0),
                 # Hidden divs for state management
                 html.Div(id="selected-upf", style={"display": "none"}, children="-1"),
                 dcc.Store(id="upf-positions", data=self.network.upf_positions.tolist()),
                 dcc.Interval(
                     id="interval-component",
-                    interval=1000,  # ms
+                    interval=self.packet_interval * 1000,  # ms
                     n_intervals=0,
                     disabled=False,
                 ),
+                # Lightweight polling of background jobs
+                dcc.Interval(id="job-interval", interval=500, n_intervals=0),
+                dcc.Store(id="job-applied", data=0),
             ],
             style={"max-width": "1200px", "margin": "0 auto", "padding": "20px"},
         )
@@ -183,6 +352,42 @@ class Dashboard:
     def setup_callbacks(self):
         """Set up all Dash callbacks"""
 
+        @self.app.callback(
+            [Output("job-status", "children"), Output("job-applied", "data")],
+            [Input("job-interval", "n_intervals")],
+            [State("job-applied", "data")],
+        )
+        def poll_jobs(n_intervals, applied_count):
+            # Nothing to do (and no graph redraw) unless a job is tracked
+            if self.optimize_job is None:
+                return dash.no_update, dash.no_update
+
+            state, applied = self.apply_finished_optimization()
+            if applied:
+                return "Optimized UPF placement applied", applied_count + 1
+            if state["status"] == DONE:
+                return (
+                    "Optimization discarded, the network changed meanwhile",
+                    dash.no_update,
+                )
+            if state["status"] in self.jobs.FINAL_STATES:
+                return f"Optimization {state['status']}", dash.no_update
+            return "Optimizing UPF placement...", dash.no_update
+
+        @self.app.callback(
+            Output("profiler-stats", "children"),
+            [
+                Input("profiler-toggle", "value"),
+                Input("profiler-interval", "n_intervals"),
+            ],
+        )
+        def update_profiler_stats(toggle, n_intervals):
+            if "on" in toggle:
+                self.profiler.enable()
+            else:
+                self.profiler.disable()
+            return self.profiler_table()
+
         @self.app.callback(
             Output("latency-stats", "children"), [Input("network-graph", "figure")]
         )
@@ -341,25 +546,32 @@ class Dashboard:
                 Input("randomize-btn", "n_clicks"),
                 Input("packets-btn", "n_clicks"),
                 Input("interval-component", "n_intervals"),
+                Input("job-applied", "data"),
             ],
             [
                 State("selected-upf", "children"),
                 State("upf-positions", "data"),
             ],
         )
+        @self.profiler.timed("dashboard.update_graph")
         def update_graph(
             clickData,
             optimize_clicks,
             randomize_clicks,
             packets_clicks,
             n_intervals,
+            jobs_applied,
             selected_upf,
             stored_positions,
         ):
             ctx = dash.callback_context
+            # Identify which input triggered the callback
+            triggered_id = (
+                ctx.triggered[0]["prop_id"].split(".")[0] if ctx.triggered else None
+            )
 
-            # Load stored UPF positions if available
-            if stored_positions:
+            # Load stored UPF positions if available (an applied job supersedes them)
+            if stored_positions and triggered_id != "job-applied":
                 self.network.upf_positions = np.array(stored_positions)
 
             if not ctx.triggered:
@@ -371,13 +583,10 @@ class Dashboard:
                     self.network.upf_positions.tolist(),
                 )
 
-            # Identify which input triggered the callback
-            triggered_id = ctx.triggered[0]["prop_id"].split(".")[0]
-
             if triggered_id == "optimize-btn":
-                # Run optimization algorithm
-                self.upf_optimizer.optimize(self.network)
-                self.update_metrics()
+                # Optimize in the background, warm-started from the last solution;
+                # poll_jobs applies the result when it is ready
+                self.optimize_in_background()
                 selected_upf = "-1"  # Reset selection after optimization
 
             elif triggered_id == "randomize-btn":
@@ -387,17 +596,15 @@ class Dashboard:
                 selected_upf = "-1"  # Reset selection after randomization
 
             elif triggered_id == "packets-btn":
-                # Generate new packet data
-                self.packet_data = self.packet_generator.generate_packets(self.network)
+                # Start a fresh packet flow
+                self.packet_generator.reset_flow()
+                self.packet_data = self.packet_generator.advance(self.network, 0.0)
 
             elif triggered_id == "interval-component":
-                # Update packets for animation
-                if (
-                    n_intervals % 2 == 0
-                ):  # Only update every other interval to reduce load
-                    self.packet_data = self.packet_generator.generate_packets(
-                        self.network
-                    )
+                # Move packets along their paths by one interval
+                self.packet_data = self.packet_generator.advance(
+                    self.network, self.packet_interval
+                )
 
             elif triggered_id == "network-graph" and clickData:
                 curr_selected = int(selected_upf)
@@ -451,8 +658,9 @@ class Dashboard:
                     # Move the selected UPF to the clicked location
                     if "x" in point and "y" in point:
                         x, y = point["x"], point["y"]
-                        self.network.upf_positions[curr_selected] = [x, y]
-                        self.update_metrics()
+                        # Only the gNBs around the old and new position are re-associated
+                        self.network.move_upf(curr_selected, [x, y], incremental=True)
+                        self.update_affected_metrics()
                         selected_upf = "-1"  # Deselect after moving
 
             # Create the figure with potentially updated data
@@ -1,11 +1,14 @@
 import plotly.graph_objects as go
 import numpy as np
+from backend.packet_generator import NODE_TYPES
+from backend.profiler import default_profiler, profiled
 
 
 class NetworkVisualizer:
-    def __init__(self):
-        pass
+    def __init__(self, profiler=None):
+        self.profiler = default_profiler if profiler is None else profiler
 
+    @profiled("figure.create")
     def create_figure(self, network, packet_data, latencies, selected_upf=-1):
         """Create a Plotly figure visualizing the network"""
         fig = go.Figure()
@@ -61,71 +64,76 @@ class NetworkVisualizer:
         )
 
         # Packets in transit
-        if packet_data and len(packet_data["positions"]) > 0:
-            # Convert to numpy for easier manipulation
-            packet_positions = np.array(packet_data["positions"])
-            packet_sizes = np.array(packet_data["size"])
+        if packet_data is not None and len(packet_data) > 0:
+            # Node names are resolved by hovertemplate from the packed type codes
+            node_names = np.array(NODE_TYPES)
+            customdata = np.column_stack(
+                [
+                    node_names[packet_data["source_type"]],
+                    packet_data["source_id"],
+                    node_names[packet_data["target_type"]],
+                    packet_data["target_id"],
+                ]
+            )
 
             # Add packet trace
             fig.add_trace(
                 go.Scatter(
-                    x=packet_positions[:, 0],
-                    y=packet_positions[:, 1],
+                    x=packet_data["x"],
+                    y=packet_data["y"],
                     mode="markers",
                     marker=dict(
                         color="yellow",
-                        size=packet_sizes,
+                        size=packet_data["size"],
                         symbol="circle",
                         line=dict(color="orange", width=1),
                     ),
                     name="Packets",
-                    hoverinfo="text",
-                    text=[
-                        f"Packet<br>From: {src[0]} {src[1]}<br>To: {tgt[0]} {tgt[1]}"
-                        for src, tgt in zip(
-                            packet_data["source"], packet_data["target"]
-                        )
-                    ],
+                    customdata=customdata,
+                    hovertemplate="Packet<br>From: %{customdata[0]} %{customdata[1]}"
+                    "<br>To: %{customdata[2]} %{customdata[3]}<extra></extra>",
                 )
             )
 
-        # Connections from UEs to gNBs
-        for ue_id in range(network.num_ues):
-            gnb_id = network.ue_to_gnb[ue_id]
-            fig.add_trace(
-                go.Scatter(
-                    x=[
-                        network.ue_positions[ue_id, 0],
-                        network.gnb_positions[gnb_id, 0],
-                    ],
-                    y=[
-                        network.ue_positions[ue_id, 1],
-                        network.gnb_positions[gnb_id, 1],
-                    ],
-                    line=dict(color="rgba(255, 0, 0, 0.5)", width=1, dash="dot"),
-                    showlegend=False,
-                    hoverinfo="none",
+        # One trace per link, usually the bulk of the figure
+        with self.profiler.stage("figure.links"):
+            # Connections from UEs to gNBs
+            for ue_id in range(network.num_ues):
+                gnb_id = network.ue_to_gnb[ue_id]
+                fig.add_trace(
+                    go.Scatter(
+                        x=[
+                            network.ue_positions[ue_id, 0],
+                            network.gnb_positions[gnb_id, 0],
+                        ],
+                        y=[
+                            network.ue_positions[ue_id, 1],
+                            network.gnb_positions[gnb_id, 1],
+                        ],
+                        line=dict(color="rgba(255, 0, 0, 0.5)", width=1, dash="dot"),
+                        showlegend=False,
+                        hoverinfo="none",
+                    )
                 )
-            )
 
-        # Connections from gNBs to UPFs
-        for gnb_id in range(network.num_gnbs):
-            upf_id = network.gnb_to_upf[gnb_id]
-            fig.add_trace(
-                go.Scatter(
-                    x=[
-                        network.gnb_positions[gnb_id, 0],
-                        network.upf_positions[upf_id, 0],
-                    ],
-                    y=[
-                        network.gnb_positions[gnb_id, 1],
-                        network.upf_positions[upf_id, 1],
-                    ],
-                    line=dict(color="rgba(0, 0, 255, 0.5)", width=1, dash="dot"),
-                    showlegend=False,
-                    hoverinfo="none",
+            # Connections from gNBs to UPFs
+            for gnb_id in range(network.num_gnbs):
+                upf_id = network.gnb_to_upf[gnb_id]
+                fig.add_trace(
+                    go.Scatter(
+                        x=[
+                            network.gnb_positions[gnb_id, 0],
+                            network.upf_positions[upf_id, 0],
+                        ],
+                        y=[
+                            network.gnb_positions[gnb_id, 1],
+                            network.upf_positions[upf_id, 1],
+                        ],
+                        line=dict(color="rgba(0, 0, 255, 0.5)", width=1, dash="dot"),
+                        showlegend=False,
+                        hoverinfo="none",
+                    )
                 )
-            )
 
         # Highlight selected UPF if any
         if selected_upf != -1:
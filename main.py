@@ -1,3 +1,4 @@
+import argparse
 import os
 import sys
 
@@ -9,12 +10,20 @@ from frontend.dashboard_app import Dashboard
 from backend.latency_calculator import LatencyCalculator
 from backend.reliability_analyzer import ReliabilityAnalyzer
 from backend.upf_optimizer import UPFOptimizer
-from backend.packet_generator import PacketGenerator
 from frontend.visualizer import NetworkVisualizer
+from backend.scenario_runner import run_scenarios
+from backend.profiler import default_profiler
 
+# UPFOptimizer strategies that run without options (capacitated and sites
+# need capacities and candidate sites), "none" keeps the initial layout
+BATCH_STRATEGIES = ["none", "kmeans", "incremental", "streaming", "kmedian", "minmax"]
+
+
+def run_dashboard(profile=False):
+    """Start the interactive dashboard, optionally with stage profiling on"""
+    if profile:
+        default_profiler.enable()
 
-def main():
-    """Entry point for the 5G URLLC Network Optimization application"""
     # Initialize the network manager (backend components)
     network_manager = NetworkManager(num_ues=15, num_gnbs=5, num_upfs=3)
 
@@ -22,7 +31,8 @@ def main():
     latency_calculator = LatencyCalculator()
     reliability_analyzer = ReliabilityAnalyzer()
     upf_optimizer = UPFOptimizer()
-    packet_generator = PacketGenerator()
+    # Seeded from the manager's root seed, so the packet flow is reproducible
+    packet_generator = network_manager.packet_generator
     visualizer = NetworkVisualizer()
 
     # Initialize the dashboard (frontend components)
@@ -41,5 +51,62 @@ def main():
     dashboard.run(debug=True, port=8050)
 
 
+def run_batch(args):
+    """Run a scenario grid headlessly and stream the results to a file"""
+    grid = {
+        "seed": args.seeds,
+        "num_ues": args.num_ues,
+        "num_gnbs": args.num_gnbs,
+        "num_upfs": args.num_upfs,
+        "association_mode": args.association_mode,
+        "active_ratio": args.active_ratio,
+        "strategy": args.strategy,
+    }
+    rows = run_scenarios(
+        grid, args.output, n_jobs=args.jobs, batch_size=args.batch_size
+    )
+    print(f"Wrote {rows} scenario results to {args.output}")
+
+
+def main():
+    """Entry point for the 5G URLLC Network Optimization application"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    subparsers = parser.add_subparsers(dest="command")
+    dashboard = subparsers.add_parser("dashboard", help="start the dashboard (default)")
+    dashboard.add_argument(
+        "--profile",
+        action="store_true",
+        help="time the backend and dashboard stages from the start",
+    )
+
+    batch = subparsers.add_parser(
+        "batch", help="run every combination of the given scenario parameters"
+    )
+    batch.add_argument("output", help="results file, .csv or .parquet")
+    batch.add_argument("--seeds", type=int, nargs="+", default=[42])
+    batch.add_argument("--num-ues", type=int, nargs="+", default=[15])
+    batch.add_argument("--num-gnbs", type=int, nargs="+", default=[5])
+    batch.add_argument("--num-upfs", type=int, nargs="+", default=[3])
+    batch.add_argument(
+        "--association-mode", nargs="+", default=["dense"], choices=["dense", "kdtree"]
+    )
+    batch.add_argument("--active-ratio", type=float, nargs="+", default=[0.3])
+    batch.add_argument(
+        "--strategy",
+        nargs="+",
+        default=["none"],
+        choices=BATCH_STRATEGIES,
+        help="UPFOptimizer strategies to apply, none keeps the initial layout",
+    )
+    batch.add_argument("--jobs", type=int, default=None, help="worker processes")
+    batch.add_argument("--batch-size", type=int, default=256)
+
+    args = parser.parse_args()
+    if args.command == "batch":
+        run_batch(args)
+    else:
+        run_dashboard(profile=getattr(args, "profile", False))
+
+
 if __name__ == "__main__":
     main()